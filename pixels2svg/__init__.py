@@ -1,6 +1,7 @@
 __version__ = '0.0.1'
 
-__all__ = ['pixels2svg', 'Drawing']
+__all__ = ['pixels2svg', 'Drawing', 'SVGCache']
 
 from pixels2svg.main import pixels2svg
+from pixels2svg.utils.cache import SVGCache
 from pixels2svg.utils.svg import Drawing
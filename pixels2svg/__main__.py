@@ -1,4 +1,10 @@
+import sys
+
 from pixels2svg.cli import run_command
+from pixels2svg.server import run_server_command
 
 if __name__ == '__main__':
-    run_command()
+    if sys.argv[1:2] == ['serve']:
+        run_server_command(sys.argv[2:])
+    else:
+        run_command()
@@ -1,7 +1,17 @@
 import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
 
 from pixels2svg.main import pixels2svg
 
+# input / output path meaning stdin / stdout
+STDIO_PATH = '-'
+
 
 class SmartFormatter(argparse.HelpFormatter):
 
@@ -13,6 +23,108 @@ class SmartFormatter(argparse.HelpFormatter):
         return res
 
 
+def _is_glob_pattern(path: str) -> bool:
+    return glob.has_magic(path)
+
+
+def expand_input_paths(inputs: List[str]) -> List[str]:
+    """Expand the CLI inputs (paths, glob patterns or directories) to the
+    list of input image paths, without duplicates.
+    Directories are not searched recursively: only the files with an
+    extension that PIL can open are kept.
+    """
+    image_extensions = {extension
+                        for extension, image_format
+                        in Image.registered_extensions().items()
+                        if image_format in Image.OPEN}
+    input_paths = []
+    for input_path in inputs:
+        if _is_glob_pattern(input_path):
+            input_paths.extend(sorted(glob.glob(input_path, recursive=True)))
+        elif os.path.isdir(input_path):
+            input_paths.extend(
+                os.path.join(input_path, file_name)
+                for file_name in sorted(os.listdir(input_path))
+                if os.path.splitext(file_name)[1].lower() in image_extensions)
+        else:
+            input_paths.append(input_path)
+    return list(dict.fromkeys(input_paths))
+
+
+def batch_output_path(input_path: str, output_dir: str) -> str:
+    file_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f'{file_name}.svg')
+
+
+def is_up_to_date(input_path: str, output_path: str) -> bool:
+    return (os.path.isfile(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(input_path))
+
+
+def _convert_file(input_path: str, output_path: str, options: Dict):
+    # top-level function so that it can be sent to the worker processes
+    pixels2svg(input_path, output_path=output_path, **options)
+
+
+def run_batch(input_paths: List[str],
+              output_dir: str,
+              options: Dict,
+              workers: Optional[int] = None,
+              force: bool = False) -> List[Tuple[str, Exception]]:
+    """Convert all the input images to SVG files in `output_dir` with a
+    pool of `workers` processes (default: number of CPUs).
+    Images whose SVG file is newer than the image are skipped, unless
+    `force` is True. A failing image doesn't stop the others.
+    The SVG files are named after the images only: an image with the same
+    name as a previous one (e.g. in another directory) is not converted
+    and reported as failed, instead of overwriting its SVG file.
+    Progress is reported on stderr.
+
+    Returns
+    -------
+    List[Tuple[str, Exception]]
+        The input path and error of each failed conversion.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    errors = []
+    output_input_paths = {}
+    jobs = {}
+    for input_path in dict.fromkeys(input_paths):
+        output_path = batch_output_path(input_path, output_dir)
+        if output_path in output_input_paths:
+            error = ValueError(f'same output path as '
+                               f'{output_input_paths[output_path]}: '
+                               f'{output_path}')
+            errors.append((input_path, error))
+            print(f'{input_path} failed: {error!r}', file=sys.stderr)
+            continue
+        output_input_paths[output_path] = input_path
+        if not force and is_up_to_date(input_path, output_path):
+            print(f'skipped (up to date): {input_path}', file=sys.stderr)
+            continue
+        jobs[input_path] = output_path
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_convert_file,
+                                   input_path,
+                                   output_path,
+                                   options): input_path
+                   for input_path, output_path in jobs.items()}
+        for i, future in enumerate(as_completed(futures), start=1):
+            input_path = futures[future]
+            error = future.exception()
+            if error is None:
+                print(f'[{i}/{len(jobs)}] {input_path} -> {jobs[input_path]}',
+                      file=sys.stderr)
+            else:
+                errors.append((input_path, error))
+                print(f'[{i}/{len(jobs)}] {input_path} failed: {error!r}',
+                      file=sys.stderr)
+
+    return errors
+
+
 def run_command():
     parser = argparse.ArgumentParser(description='pixels2svg CLI',
                                      formatter_class=SmartFormatter)
@@ -20,14 +132,37 @@ def run_command():
         'input',
         metavar='<input path>',
         type=str,
+        nargs='+',
         help='Path to the input the bitmap image '
-             '(anything supported by PIL.Image).')
+             '(anything supported by PIL.Image), or `-` to read the image '
+             'data from stdin.\n'
+             'Several paths, glob patterns or directories can be passed to '
+             'convert several images (see `--output_dir`).')
     parser.add_argument(
         '--output', '-o',
         metavar='<path>',
         type=str,
-        help='Path to the output SVG image.\n If not  passed, will print '
-             'the output in the terminal.')
+        help='Path to the output SVG image.\n If not  passed or `-`, the '
+             'output is streamed to stdout.')
+    parser.add_argument(
+        '--output_dir', '-d',
+        metavar='<path>',
+        type=str,
+        help='Batch mode: directory of the output SVG images (named after '
+             'the input images). Required when converting several images.')
+    parser.add_argument(
+        '--workers', '-j',
+        metavar='<int>',
+        type=int,
+        help='Batch mode: number of worker processes converting the '
+             'images (default: number of CPUs).\n'
+             'Single image: number of tiles of the image traced in parallel '
+             'processes (default: 1), for very large images.')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='(Only relevant in batch mode)\n'
+             'Convert the images even if their SVG image is newer.')
     parser.add_argument(
         '--color_tolerance', '-c',
         metavar='<int>',
@@ -61,6 +196,14 @@ def run_command():
              'you to control how progressive the background detection should '
              'be with blurred contours.\n'
              'Size is expressed in %% of total image pixels.')
+    parser.add_argument(
+        '--background_mask_size',
+        metavar='<int>',
+        type=int,
+        help='(Only relevant when `remove_background = True`)\n'
+             'Detect the background on the image downscaled so that its '
+             'largest side is at most this number of pixels, which is much '
+             'faster for large images.')
     parser.add_argument(
         '--no_group_by_color',
         action='store_true',
@@ -72,14 +215,55 @@ def run_command():
 
     args = parser.parse_args()
 
-    output_str = pixels2svg(
-        args.input,
-        output_path=args.output if args.output else None,
+    options = dict(
         group_by_color=not args.no_group_by_color,
-        as_string=not args.output,
         pretty=not args.no_pretty,
         color_tolerance=args.color_tolerance,
         remove_background=args.remove_background,
+        background_tolerance=args.background_tolerance,
+        maximal_non_bg_artifact_size=args.maximal_non_bg_artifact_size,
+        background_mask_size=args.background_mask_size,
     )
-    if output_str:
-        print(output_str)
+
+    is_batch = (args.output_dir is not None
+                or len(args.input) > 1
+                or _is_glob_pattern(args.input[0])
+                or os.path.isdir(args.input[0]))
+    if is_batch:
+        if args.output_dir is None:
+            parser.error('--output_dir is required to convert several '
+                         'images')
+        if args.output:
+            parser.error('--output cannot be used to convert several images, '
+                         'use --output_dir')
+        if STDIO_PATH in args.input:
+            parser.error('stdin (`-`) can only be used to convert a single '
+                         'image')
+        errors = run_batch(expand_input_paths(args.input),
+                           args.output_dir,
+                           options,
+                           workers=args.workers,
+                           force=args.force)
+        if errors:
+            sys.exit(1)
+        return
+
+    to_stdout = not args.output or args.output == STDIO_PATH
+    try:
+        pixels2svg(
+            sys.stdin.buffer if args.input[0] == STDIO_PATH
+            else args.input[0],
+            # stream the SVG code to stdout if there is no output path: it
+            # is encoded and written by chunks as the shapes are serialized
+            output_path=sys.stdout.buffer if to_stdout else args.output,
+            workers=args.workers or 1,
+            **options
+        )
+        if to_stdout:
+            print()
+            sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader of the output pipe exited (e.g. `| head`): exit
+        # silently, without flushing the remaining output again at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -1,31 +1,32 @@
 from collections import OrderedDict
-from typing import Dict, List, Optional, Tuple, TypeVar, Union
+from io import StringIO
+from typing import (Dict, Iterator, List, Optional, TextIO, Tuple, TypeVar,
+                    Union)
 
-import cc3d
 import numpy as np
 from svgwrite.container import Group
 
-from pixels2svg.utils import geometry, pixel, preprocessing, svg
+from pixels2svg.utils import pixel, preprocessing, svg, tracing
+from pixels2svg.utils.blobs import LabelledImage
+from pixels2svg.utils.cache import SVGCache
 from pixels2svg.utils.geometry import Contours
+from pixels2svg.utils.tracing import LabelsTrace
 
 T = TypeVar('T')
 
 
-def find_contours(
-        rgba_array: np.ndarray,
+def sort_traced_contours(
+        trace: LabelsTrace,
         group_by_color: bool = False
 ) -> Union[Dict[pixel.PixelRGBA, Tuple[Contours, ...]],
            Tuple[Tuple[Contours, pixel.PixelRGBA], ...]]:
-    id_array = pixel.rgba_array_to_id_array(rgba_array)
-    labels = cc3d.connected_components(id_array,
-                                       out_dtype=np.uint64,
-                                       connectivity=4)
+    """Sort the traced shapes by area, grouped by color if
+    `group_by_color`.
+    """
     if group_by_color:
         all_contours: dict = {}
-        result = OrderedDict()
     else:
         all_contours: list = []
-        result = tuple()
 
     def sort_contours_by_area(
             contours_list: List[Tuple[T, int]]) -> Tuple[T, ...]:
@@ -34,16 +35,10 @@ def find_contours(
                                  reverse=True)
         return tuple(c[0] for c in sorted_contours)
 
-    for blob_id, blob_shape in cc3d.each(labels, binary=True, in_place=True):
-
-        pixel_coord = geometry.find_first_non_zero_coords(blob_shape)
-        color = tuple(rgba_array[pixel_coord])
-        # ignore transparent pixels
-        if color[3] == 0:
-            continue
+    for blob_id, contours in trace.labels_contours.items():
 
-        contours: Contours = geometry.calculate_blob_contours(blob_shape)
-        shape_area = blob_shape.sum()
+        color = trace.labels_colors[blob_id]
+        shape_area = trace.labels_areas[blob_id]
 
         if group_by_color:
             all_contours: dict
@@ -55,27 +50,43 @@ def find_contours(
             all_contours: list
             all_contours.append(((contours, color), shape_area))
 
-        if group_by_color:
-            sorted_colors = sort_contours_by_area(
-                [(color, sum(c[1] for c in contours_list))
-                 for color, contours_list in all_contours.items()]
-            )
-            result = OrderedDict()
-            for color in sorted_colors:
-                result[color] = sort_contours_by_area(all_contours[color])
-        else:
-            result = sort_contours_by_area(all_contours)
+    # sort the shapes by area only once all the blobs have been traced
+    if group_by_color:
+        sorted_colors = sort_contours_by_area(
+            [(color, sum(c[1] for c in contours_list))
+             for color, contours_list in all_contours.items()]
+        )
+        result = OrderedDict()
+        for color in sorted_colors:
+            result[color] = sort_contours_by_area(all_contours[color])
+    else:
+        result = sort_contours_by_area(all_contours)
 
     return result
 
 
-def trace_pixel_polygons_as_svg(rgba_array: np.ndarray,
-                                group_by_color: bool = False) -> svg.Drawing:
-    traced_contours = find_contours(rgba_array, group_by_color)
+def find_contours(
+        rgba_array: np.ndarray,
+        group_by_color: bool = False,
+        workers: int = 1
+) -> Union[Dict[pixel.PixelRGBA, Tuple[Contours, ...]],
+           Tuple[Tuple[Contours, pixel.PixelRGBA], ...]]:
+    return sort_traced_contours(tracing.trace_labels(rgba_array, workers),
+                                group_by_color)
 
-    svg_img = svg.Drawing(rgba_array.shape[0], rgba_array.shape[1])
 
-    has_opacity = np.any(rgba_array[:, :, 3] < 255)
+def _iter_svg_shapes(
+        trace: LabelsTrace,
+        group_by_color: bool = False
+) -> Iterator[Tuple[Optional[str],
+                    List[Tuple[str, Contours, pixel.PixelRGBA]]]]:
+    """Yield the traced shapes of the image with their SVG ids,
+    as (group id, [(shape id, contours, color), ...]) tuples. The group id
+    is None if the shapes are not grouped by color.
+    """
+    traced_contours = sort_traced_contours(trace, group_by_color)
+
+    has_opacity = trace.has_opacity
 
     def color_to_id(color: pixel.PixelRGBA) -> str:
         hex_color = pixel.rgb_color_to_hex_code(color[:3])[1:]
@@ -89,46 +100,114 @@ def trace_pixel_polygons_as_svg(rgba_array: np.ndarray,
         traced_contours: Dict[pixel.PixelRGBA, Tuple[Contours, ...]]
         for color, contours_tuple in traced_contours.items():
             color_id = color_to_id(color)
-            group = Group(id=color_id)
-            for i, contour in enumerate(contours_tuple, start=1):
-                polygon_id = f'{color_id}_shape{i}'
-                svg.draw_polygon(group,
-                                 contour.outside,
-                                 holes=contour.inner_holes,
-                                 color=color,
-                                 id=polygon_id)
-            svg_img.add(group)
+            yield color_id, [(f'{color_id}_shape{i}', contour, color)
+                             for i, contour in enumerate(contours_tuple,
+                                                         start=1)]
 
     else:
         traced_contours: Tuple[Tuple[Contours, pixel.PixelRGBA], ...]
-        for i, (contour, color) in enumerate(traced_contours, start=1):
-            color_id = color_to_id(color)
-            polygon_id = f'shape{i}_{color_id}'
-            svg.draw_polygon(svg_img,
-                             contour.outside,
-                             holes=contour.inner_holes,
-                             color=color,
-                             id=polygon_id)
+        yield None, [(f'shape{i}_{color_to_id(color)}', contour, color)
+                     for i, (contour, color) in enumerate(traced_contours,
+                                                          start=1)]
+
+
+def trace_pixel_polygons_as_svg(rgba_array: np.ndarray,
+                                group_by_color: bool = False,
+                                workers: int = 1,
+                                trace: Optional[LabelsTrace] = None
+                                ) -> svg.Drawing:
+    """Trace the shapes of the image as a `Drawing`.
+    If the `trace` of the image is passed, e.g. updated by
+    `tracing.retrace_labels` after an edit of the image, its shapes are
+    used instead of tracing the image again, and `rgba_array` is only used
+    for the size of the image.
+    """
+    if trace is None:
+        trace = tracing.trace_labels(rgba_array, workers)
+    svg_img = svg.Drawing(rgba_array.shape[0], rgba_array.shape[1])
+
+    for group_id, shapes in _iter_svg_shapes(trace, group_by_color):
+        parent = svg_img if group_id is None else Group(id=group_id)
+        for polygon_id, contour, color in shapes:
+            svg.draw_path(parent,
+                          svg.contours_to_path_data(contour),
+                          color=color,
+                          id=polygon_id)
+        if group_id is not None:
+            svg_img.add(parent)
 
     return svg_img
 
 
-def pixels2svg(input_path: str,
-               output_path: Optional[str] = None,
+def write_pixel_polygons_as_svg(rgba_array: np.ndarray,
+                                fileobj: TextIO,
+                                group_by_color: bool = False,
+                                pretty: bool = False,
+                                workers: int = 1,
+                                trace: Optional[LabelsTrace] = None):
+    """Same as `trace_pixel_polygons_as_svg(...).write(fileobj, pretty)`,
+    but the SVG code of each shape is written as soon as it is ready,
+    without building a `Drawing`.
+    """
+    if trace is None:
+        trace = tracing.trace_labels(rgba_array, workers)
+    svg_writer = svg.SVGWriter(fileobj,
+                               rgba_array.shape[0],
+                               rgba_array.shape[1],
+                               pretty=pretty)
+
+    for group_id, shapes in _iter_svg_shapes(trace, group_by_color):
+        if group_id is not None:
+            svg_writer.open_group(group_id)
+        for polygon_id, contour, color in shapes:
+            svg_writer.write_path(svg.contours_to_path_data(contour),
+                                  color=color,
+                                  id=polygon_id)
+        if group_id is not None:
+            svg_writer.close_group()
+
+    svg_writer.close()
+
+
+def _output_svg_string(
+        svg_str: str,
+        output_path: Optional[svg.SVGOutput]) -> Optional[str]:
+    if output_path:
+        with svg.open_text_output(output_path) as svg_file:
+            svg_file.write(svg_str)
+        return None
+    return svg_str
+
+
+def pixels2svg(input_path: pixel.ImageInput,
+               output_path: Optional[svg.SVGOutput] = None,
                group_by_color: bool = True,
                color_tolerance: int = 0,
                remove_background: bool = False,
                background_tolerance: float = 1.0,
                maximal_non_bg_artifact_size: float = 2.0,
+               background_mask_size: Optional[int] = None,
                as_string: bool = False,
-               pretty: bool = True,) -> Optional[Union[svg.Drawing, str]]:
+               pretty: bool = True,
+               workers: int = 1,
+               cache: Optional[SVGCache] = None
+               ) -> Optional[Union[svg.Drawing, str]]:
     """
     Parameters
     ----------
-    input_path: str
-        Path of the input bitmap image
-    output_path: Optional[str]
-        Path of the output SVG image (optional).
+    input_path: pixel.ImageInput
+        Path of the input bitmap image, or the image itself as a binary file
+        object, encoded image data (`bytes`, `bytearray`, `memoryview`), a
+        `PIL.Image.Image` or an RGBA/RGB uint8 `np.ndarray` in X/Y
+        convention (like the arrays returned by `pixel.read_image`).
+        Palette ('P' mode) images are traced on their palette indices,
+        unless `color_tolerance` or `remove_background` is used.
+    output_path: Optional[svg.SVGOutput]
+        Path (`str` or `os.PathLike`) of the output SVG image, or writable
+        text or binary file object (e.g. `sys.stdout`) to write it to
+        (optional).
+        The SVG code is written shape by shape, without building the whole
+        document in memory.
         If passed, the function will return None.
         If not passed, the function will return the SVG data as a `str` or a
         `Drawing` depending on the `as_string` parameter.
@@ -155,11 +234,24 @@ def pixels2svg(input_path: str,
         Combined with `background_tolerance`, this allows you to control how
         progressive the background detection should be with blurred contours.
         Size is expressed in % of total image pixels.
+    background_mask_size: Optional[int]
+        (Only relevant when `remove_background = True`)
+        If passed, the background is detected on the image downscaled so
+        that its largest side is at most this number of pixels, which is
+        much faster for large images (optional).
     as_string: bool
         If True and no `output_path` is passed, return a `str` representing
         the SVG data. (default False)
     pretty: bool
         If True (default), output SVG code is pretty-printed.
+    workers: int
+        If > 1, the image is split in as many tiles, whose shapes are traced
+        in parallel processes and stitched back together (default 1).
+        Only worth it for very large images.
+    cache: Optional[SVGCache]
+        If passed, the SVG data is looked up in / stored to this cache,
+        based on the image pixels and the options (optional).
+        Not used when a `Drawing` is returned.
 
     Returns
     -------
@@ -167,25 +259,85 @@ def pixels2svg(input_path: str,
         Depends on the `output_path` and `as_string` parameters
     """
 
-    img_rgba_array = pixel.read_image(input_path)
-
-    if color_tolerance > 0:
-        img_rgba_array = preprocessing.apply_color_tolerance(
-            img_rgba_array,
-            color_tolerance)
+    if color_tolerance > 0 or remove_background:
+        img_array, palette = pixel.load_image(input_path), None
+        if (remove_background and color_tolerance == 0
+                and img_array is input_path):
+            # `remove_background` writes into the array: don't modify the
+            # input. Keep its memory layout, which the order of the labels
+            # depends on.
+            img_array = img_array.copy(order='K')
+    else:
+        # palette images are traced on their color indices, without
+        # expanding them to RGBA
+        img_array, palette = pixel.load_indexed_image(input_path)
 
-    if remove_background:
-        img_rgba_array = preprocessing.remove_background(
-            img_rgba_array,
+    use_cache = cache is not None and (output_path or as_string)
+    if use_cache:
+        cache_key = cache.key(
+            img_array,
+            palette=None if palette is None else palette.tolist(),
+            group_by_color=group_by_color,
+            color_tolerance=color_tolerance,
+            remove_background=remove_background,
             background_tolerance=background_tolerance,
-            maximal_non_bg_artifact_size=maximal_non_bg_artifact_size)
+            maximal_non_bg_artifact_size=maximal_non_bg_artifact_size,
+            background_mask_size=background_mask_size,
+            pretty=pretty)
+        svg_str = cache.get(cache_key)
+        if svg_str is not None:
+            return _output_svg_string(svg_str, output_path)
+
+    if palette is None:
+        # the color IDs and the labels of the image are carried through the
+        # preprocessing steps to the tracing, to compute them only once
+        image = LabelledImage(img_array)
+
+        if color_tolerance > 0:
+            image = preprocessing.apply_color_tolerance_labelled(
+                image,
+                color_tolerance)
+
+        if remove_background:
+            image = preprocessing.remove_background_labelled(
+                image,
+                background_tolerance=background_tolerance,
+                maximal_non_bg_artifact_size=maximal_non_bg_artifact_size,
+                mask_size=background_mask_size)
+
+        img_array = image.rgba_array
+        trace = tracing.trace_labelled_image(image, workers)
+    else:
+        trace = tracing.trace_palette_labels(img_array, palette, workers)
 
-    svg_drawing = trace_pixel_polygons_as_svg(img_rgba_array, group_by_color)
+    if use_cache:
+        with StringIO() as svg_io:
+            write_pixel_polygons_as_svg(img_array,
+                                        svg_io,
+                                        group_by_color,
+                                        pretty,
+                                        trace=trace)
+            svg_str = svg_io.getvalue()
+        cache.put(cache_key, svg_str)
+        return _output_svg_string(svg_str, output_path)
 
     if output_path:
-        svg_drawing.save_to_path(output_path, pretty)
+        with svg.open_text_output(output_path) as svg_file:
+            write_pixel_polygons_as_svg(img_array,
+                                        svg_file,
+                                        group_by_color,
+                                        pretty,
+                                        trace=trace)
     else:
         if as_string:
-            return svg_drawing.to_string(pretty)
+            with StringIO() as svg_io:
+                write_pixel_polygons_as_svg(img_array,
+                                            svg_io,
+                                            group_by_color,
+                                            pretty,
+                                            trace=trace)
+                return svg_io.getvalue()
         else:
-            return svg_drawing
+            return trace_pixel_polygons_as_svg(img_array,
+                                               group_by_color,
+                                               trace=trace)
@@ -0,0 +1,182 @@
+import argparse
+import base64
+import json
+import os
+import signal
+import socketserver
+import stat
+import sys
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pixels2svg.cli import SmartFormatter
+from pixels2svg.main import pixels2svg
+
+
+def run_job(job: Dict) -> Dict:
+    """Run a conversion job, given as a dict with the keys:
+    - `id` (optional): any JSON value, returned as is in the response
+    - `input`: path of the input image, or `data`: the encoded image data
+      in base64
+    - `output` (optional): path of the output SVG image
+    - `options` (optional): other keyword arguments of `pixels2svg`
+
+    Returns
+    -------
+    Dict
+        The response: the `id` of the job, with either the SVG code as
+        `svg` (or the `output` path it was written to), or an `error`.
+    """
+    response = {'id': job.get('id')}
+    try:
+        if 'data' in job:
+            input_image = base64.b64decode(job['data'])
+        else:
+            input_image = job['input']
+        svg_str = pixels2svg(input_image,
+                             output_path=job.get('output'),
+                             as_string=True,
+                             **job.get('options', {}))
+    except Exception as error:
+        response['error'] = f'{type(error).__name__}: {error}'
+        return response
+    if svg_str is None:
+        response['output'] = job['output']
+    else:
+        response['svg'] = svg_str
+    return response
+
+
+def serve_lines(lines: Iterable[str],
+                write_line: Callable[[str], None],
+                executor: Executor):
+    """Run the JSON-lines jobs of `lines` (see `run_job`) in `executor`,
+    and write the JSON line of each response with `write_line` as soon as
+    it is ready: the responses are in completion order, not in the order
+    of the jobs. Returns once all the jobs are done.
+    """
+    lock = threading.Lock()
+
+    def write_response(response: Dict):
+        with lock:
+            write_line(json.dumps(response))
+
+    def on_done(job_id, responded: threading.Event, future: Future):
+        error = future.exception()
+        if error is None:
+            write_response(future.result())
+        else:
+            # the job could not run at all, e.g. a worker process died
+            write_response({'id': job_id,
+                            'error': f'{type(error).__name__}: {error}'})
+        responded.set()
+
+    # wait for the responses to be written rather than for the futures,
+    # whose callbacks run after the waiters are notified
+    responded_events: List[threading.Event] = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError(f'expected a JSON object, got {line!r}')
+        except ValueError as error:
+            write_response({'id': None,
+                            'error': f'{type(error).__name__}: {error}'})
+            continue
+        responded = threading.Event()
+        executor.submit(run_job, job).add_done_callback(
+            partial(on_done, job.get('id'), responded))
+        responded_events.append(responded)
+    for responded in responded_events:
+        responded.wait()
+
+
+def serve_stdio(executor: Executor):
+    """Read the jobs from stdin and write the responses to stdout, until
+    stdin is closed."""
+
+    def write_line(line: str):
+        sys.stdout.write(f'{line}\n')
+        sys.stdout.flush()
+
+    serve_lines(sys.stdin, write_line, executor)
+
+
+def make_unix_socket_server(socket_path: str,
+                            executor: Executor
+                            ) -> socketserver.ThreadingUnixStreamServer:
+    """Return a server reading jobs from the connections to a Unix socket
+    at `socket_path`, and writing the responses back to each connection.
+    Connections are handled in parallel threads sharing `executor`.
+    A stale socket file at `socket_path` is replaced.
+    """
+
+    class JobsHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            def write_line(line: str):
+                self.wfile.write(f'{line}\n'.encode('utf-8'))
+                self.wfile.flush()
+
+            serve_lines((line.decode('utf-8') for line in self.rfile),
+                        write_line,
+                        executor)
+
+    if (os.path.exists(socket_path)
+            and stat.S_ISSOCK(os.stat(socket_path).st_mode)):
+        os.remove(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, JobsHandler)
+    server.daemon_threads = True
+    return server
+
+
+def run_server_command(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog='pixels2svg serve',
+        description='pixels2svg worker server: keeps worker processes '
+                    'running to convert images without paying the startup '
+                    'cost for each image. '
+                    'Jobs are JSON objects, one per line, with the keys '
+                    '`id` (optional), `input` (path) or `data` (base64 '
+                    'image data), `output` (optional path) and `options` '
+                    '(optional `pixels2svg()` arguments). '
+                    'Each response is a JSON line with the `id` of its job '
+                    'and either `svg` (the SVG code), `output` or `error`.',
+        formatter_class=SmartFormatter)
+    parser.add_argument(
+        '--socket', '-s',
+        metavar='<path>',
+        type=str,
+        help='Path of a Unix socket to accept jobs on.\n'
+             'If not passed, jobs are read from stdin and responses written '
+             'to stdout.')
+    parser.add_argument(
+        '--workers', '-j',
+        metavar='<int>',
+        type=int,
+        help='Number of worker processes (default: number of CPUs).')
+
+    args = parser.parse_args(args)
+
+    # Ctrl+C is handled by the main process only, which stops the workers
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             initializer=signal.signal,
+                             initargs=(signal.SIGINT,
+                                       signal.SIG_IGN)) as executor:
+        try:
+            if args.socket is None:
+                serve_stdio(executor)
+                return
+            server = make_unix_socket_server(args.socket, executor)
+            try:
+                print(f'listening on {args.socket}', file=sys.stderr)
+                server.serve_forever()
+            finally:
+                server.server_close()
+                os.remove(args.socket)
+        except KeyboardInterrupt:
+            pass
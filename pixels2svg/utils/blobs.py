@@ -0,0 +1,50 @@
+from typing import Optional
+
+import cc3d
+import numpy as np
+
+from pixels2svg.utils.pixel import (TRUE_TRANSPARENT, rgba_array_to_id_array,
+                                    rgba_to_id)
+
+
+class LabelledImage:
+
+    def __init__(self,
+                 rgba_array: np.ndarray,
+                 id_array: Optional[np.ndarray] = None,
+                 labels: Optional[np.ndarray] = None):
+        """RGBA image with the color IDs of its pixels and the labels of its
+        blobs of same color, carried between the steps of the conversion so
+        that they are packed and labelled only once.
+        `id_array` and `labels` are computed when first needed if they are
+        not passed.
+        """
+        self.rgba_array: np.ndarray = rgba_array
+        self._id_array: Optional[np.ndarray] = id_array
+        self._labels: Optional[np.ndarray] = labels
+
+    @property
+    def id_array(self) -> np.ndarray:
+        if self._id_array is None:
+            self._id_array = rgba_array_to_id_array(self.rgba_array)
+        return self._id_array
+
+    @property
+    def labels(self) -> np.ndarray:
+        if self._labels is None:
+            self._labels = cc3d.connected_components(self.id_array,
+                                                     out_dtype=np.uint64,
+                                                     connectivity=4)
+        return self._labels
+
+    def clear(self, mask: np.ndarray):
+        """Make the pixels of `mask`, which must be made of whole blobs,
+        `TRUE_TRANSPARENT`, in place.
+        Their blobs are given label 0 instead of being labelled again: the
+        other blobs keep the same labels.
+        """
+        self.rgba_array[mask] = TRUE_TRANSPARENT
+        if self._id_array is not None:
+            self._id_array[mask] = rgba_to_id(TRUE_TRANSPARENT)
+        if self._labels is not None:
+            self._labels[mask] = 0
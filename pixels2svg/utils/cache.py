@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+from pixels2svg.__version__ import __version__
+
+
+class SVGCache:
+
+    def __init__(self, directory: str, max_size: int = 256 * 1024 ** 2):
+        """On-disk cache of SVG conversion results, keyed on the hash of
+        the decoded image and of the conversion options.
+        When the SVG files take more than `max_size` bytes, the least
+        recently used ones are removed.
+        `hits` and `misses` count the lookups of this instance.
+        """
+        self.directory: str = directory
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(rgba_array: np.ndarray, **options) -> str:
+        sha256 = hashlib.sha256()
+        sha256.update(json.dumps([__version__,
+                                  rgba_array.shape,
+                                  str(rgba_array.dtype),
+                                  sorted(options.items())]).encode('utf-8'))
+        # hash the pixels in PIL's Y/X order, which is how the arrays of
+        # `read_image` are laid out in memory: no copy is needed for them
+        sha256.update(np.ascontiguousarray(np.swapaxes(rgba_array, 0, 1)))
+        return sha256.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.svg')
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as svg_file:
+                svg_str = svg_file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # the modification time is used as last access time for eviction
+        os.utime(path)
+        self.hits += 1
+        return svg_str
+
+    def put(self, key: str, svg_str: str):
+        path = self._path(key)
+        # write to a temporary file first so that other processes sharing
+        # the cache never read a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as svg_file:
+            svg_file.write(svg_str)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used SVG files until they take at
+        most `max_size` bytes.
+        """
+        entries = []
+        for dir_entry in os.scandir(self.directory):
+            if dir_entry.name.endswith('.svg'):
+                stat = dir_entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            total_size -= size
@@ -1,4 +1,4 @@
-from typing import Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -25,141 +25,345 @@ def bounding_box(points: Polygon) -> BoundingBox:
     return x_min, x_max, y_min, y_max
 
 
-def minimal_polygon(points: Polygon) -> Polygon:
-    current_n_points = len(points)
-    previous_n_points = current_n_points + 1
-    current_points = list(points)
-
-    def points_on_same_line(p1: Point, p2: Point, p3: Point) -> bool:
-        return (p1[0] == p2[0] == p3[0]) or (p1[1] == p2[1] == p3[1])
-
-    while previous_n_points > current_n_points:
-        indices_to_remove = set()
-        modulo = current_n_points
-        for i in range(current_n_points // 3 + current_n_points % 3 + 2):
-            i1 = i * 3
-            i2 = i * 3 + 1
-            i3 = i * 3 + 2
-            i1, i2, i3 = (p % modulo for p in (i1, i2, i3))
-            p1, p2, p3 = (current_points[i_] for i_ in (i1, i2, i3))
-            if points_on_same_line(p1, p2, p3):
-                indices_to_remove.add(i2)
+def minimal_polygon_array(points: np.ndarray) -> np.ndarray:
+    """Remove all the points that are on the same horizontal or vertical
+    line as their previous and next points, in a single vectorized pass.
+    `points` is an (N, 2) array of the points of a closed polygon.
+    """
+    previous_points = np.roll(points, 1, axis=0)
+    next_points = np.roll(points, -1, axis=0)
+    same_line = np.logical_or(
+        np.logical_and(previous_points[:, 0] == points[:, 0],
+                       points[:, 0] == next_points[:, 0]),
+        np.logical_and(previous_points[:, 1] == points[:, 1],
+                       points[:, 1] == next_points[:, 1]))
+    return points[~same_line]
 
-        previous_n_points = len(current_points)
-        for index in sorted(indices_to_remove, reverse=True):
-            del current_points[index]
-        current_n_points = len(current_points)
 
-    return tuple(current_points)
+def minimal_polygon(points: Polygon) -> Polygon:
+    minimal_points = minimal_polygon_array(np.asarray(points))
+    return tuple(tuple(point) for point in minimal_points.tolist())
 
 
 class Contours:
 
+    __slots__ = ('vertices', 'ring_offsets')
+
     def __init__(self,
                  outside: Polygon,
                  inner_holes: Optional[Tuple[Polygon, ...]] = None):
         """Small class representing a shape with a polygonal contour,
         and potential holes in it.
-        Outer and inner contours are tuples of points ordered clockwise.
+        Outer and inner contours are ordered clockwise.
+        The points of all the contours are stored in a single (N, 2) int32
+        array `vertices`, and contour `i` is
+        `vertices[ring_offsets[i]:ring_offsets[i + 1]]` (the outside contour
+        comes first). `outside` and `inner_holes` return them as tuples.
         """
-        self.outside: Polygon = outside
-        self.inner_holes: Tuple[Polygon, ...] = inner_holes or tuple()
+        rings = (outside, *(inner_holes or tuple()))
+        self.ring_offsets: np.ndarray = np.cumsum(
+            [0, *(len(ring) for ring in rings)])
+        self.vertices: np.ndarray = np.array(
+            [point for ring in rings for point in ring],
+            dtype=np.int32).reshape(-1, 2)
 
+    @classmethod
+    def from_arrays(cls,
+                    vertices: np.ndarray,
+                    ring_offsets: np.ndarray) -> 'Contours':
+        contours = cls.__new__(cls)
+        contours.vertices = vertices
+        contours.ring_offsets = ring_offsets
+        return contours
 
-def _get_pixel_contour_segments(blob: np.ndarray,
-                                i: int,
-                                j: int) -> Tuple[Line, ...]:
-    """Return a tuple of lines corresponding to the exterior contours at
-    point (i, j) of the polygon
+    def rings(self) -> List[np.ndarray]:
+        """Return the (N, 2) array of each contour, the outside first."""
+        return np.split(self.vertices, self.ring_offsets[1:-1])
+
+    @property
+    def outside(self) -> Polygon:
+        outside_vertices = self.vertices[:self.ring_offsets[1]]
+        return tuple(tuple(point) for point in outside_vertices.tolist())
+
+    @property
+    def inner_holes(self) -> Tuple[Polygon, ...]:
+        return tuple(tuple(tuple(point) for point in ring.tolist())
+                     for ring in self.rings()[1:])
+
+
+def _get_contour_segments(
+        labels: np.ndarray,
+        first_row: int = 0,
+        end_row: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the exterior contours of all the non-zero labels of the image
+    as an integer array of lines of shape (N, 2, 2) (start point, end point),
+    with the (N,) array of the label of each line.
+    A pixel side is part of the contours of its label when the neighbouring
+    pixel has a different label (or when it is on the image border). Lines
+    are oriented so that the label is on their right (with the y axis
+    pointing down), i.e. the contours are clockwise.
+    Only the sides of the pixels of rows `first_row` to `end_row` (along
+    the first axis) are returned, the other rows are only used as
+    neighbours.
     """
-    lines = []
+    non_zero = labels != 0
 
-    left_side = ((i, j+1), (i, j))
-    right_side = ((i + 1, j), (i + 1, j + 1))
-    top_side = ((i, j), (i + 1, j))
-    bottom_side = ((i + 1, j + 1), (i, j + 1))
+    left_sides = non_zero.copy()
+    left_sides[1:, :] &= labels[1:, :] != labels[:-1, :]
+    right_sides = non_zero.copy()
+    right_sides[:-1, :] &= labels[:-1, :] != labels[1:, :]
+    top_sides = non_zero.copy()
+    top_sides[:, 1:] &= labels[:, 1:] != labels[:, :-1]
+    bottom_sides = non_zero.copy()
+    bottom_sides[:, :-1] &= labels[:, :-1] != labels[:, 1:]
 
-    if (i == 0
-            or (i > 0 and not blob[i - 1, j])):
-        lines.append(left_side)
-    if (i == blob.shape[0] - 1
-            or (i < blob.shape[0] - 1 and not blob[i + 1, j])):
-        lines.append(right_side)
+    # (mask, start point offset, end point offset) for each side of a pixel
+    sides = (
+        (left_sides, (0, 1), (0, 0)),
+        (right_sides, (1, 0), (1, 1)),
+        (top_sides, (0, 0), (1, 0)),
+        (bottom_sides, (1, 1), (0, 1)),
+    )
 
-    if (j == 0
-            or (j > 0 and not blob[i, j - 1])):
-        lines.append(top_side)
-    if (j == blob.shape[1] - 1
-            or (j < blob.shape[1] - 1 and not blob[i, j + 1])):
-        lines.append(bottom_side)
+    segment_labels = []
+    segments = []
+    for side_mask, start_offset, end_offset in sides:
+        i, j = np.nonzero(side_mask[first_row:end_row])
+        i += first_row
+        segment_labels.append(labels[i, j])
+        segments.append(np.stack([i + start_offset[0],
+                                  j + start_offset[1],
+                                  i + end_offset[0],
+                                  j + end_offset[1]], axis=-1))
 
-    return tuple(lines)
+    return (np.concatenate(segments).reshape(-1, 2, 2),
+            np.concatenate(segment_labels))
 
 
-def calculate_blob_contours(blob: np.ndarray) -> Contours:
+def _link_segments(
+        segments: np.ndarray,
+        segment_labels: np.ndarray,
+        open_end_xs: Tuple[int, ...] = ()
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[int]]:
+    """Find the next line of each contour line in linear time: the next
+    line is looked up in a table of lines sorted by label and start point.
+    If a blob touches itself diagonally (two candidate lines for the next
+    point), we turn left so that each polygon separates the blob from a
+    single region.
+    The lines ending on a point with an x in `open_end_xs` are left
+    without next line (-1).
+    Return the start points, end points and labels of the sorted lines,
+    with the index of the next line of each line.
+    """
+
+    # sort lines by label, then by start point, then by end point
+    order = np.lexsort((segments[:, 1, 1],
+                        segments[:, 1, 0],
+                        segments[:, 0, 1],
+                        segments[:, 0, 0],
+                        segment_labels))
+    segments = segments[order]
+    segment_labels = segment_labels[order]
+    starts = segments[:, 0]
+    ends = segments[:, 1]
+    n_segments = len(segments)
+    if n_segments == 0:
+        return starts, ends, segment_labels, []
+
+    # encode (label, point) pairs as integers, in the same order as the
+    # sorted lines
+    label_ranks = np.zeros(n_segments, dtype=np.int64)
+    np.cumsum(segment_labels[1:] != segment_labels[:-1], out=label_ranks[1:])
+    width = int(segments[:, :, 0].max()) + 1
+    height = int(segments[:, :, 1].max()) + 1
+    label_keys = label_ranks * (width * height)
+    start_keys = label_keys + starts[:, 0] * height + starts[:, 1]
+    end_keys = label_keys + ends[:, 0] * height + ends[:, 1]
 
-    # get list of 2D coordinates of points of blob
-    non_zero = np.nonzero(blob)
-    pixels = tuple((x, y) for x, y in zip(non_zero[0], non_zero[1]))
-
-    # build set of polygon lines
-    lines = set()
-    for pixel in pixels:
-        pixel_side_lines = _get_pixel_contour_segments(blob, *pixel)
-        for line in pixel_side_lines:
-            lines.add(line)
-
-    # this will contain the polygons we build
-    polygons = []
-
-    # we will pick a line L1, then find the next line L2 (L1[1] == L2[0])
-    # => each point is only shared by two lines
-    iter_lines = lines.copy()
-    current_line = iter_lines.pop()
-    ordered_points = [*current_line]
-    while len(iter_lines) > 0:
-        found = False
-        for line in iter_lines:
-            if line[0] == current_line[1]:
-                ordered_points.append(line[1])
-                current_line = line
-                iter_lines.remove(line)
-                found = True
-                break
-        if not found:
-            # this happens only when there are multiple polygons
-            if ordered_points[-1] == ordered_points[0]:
-                # we're done with the current polygon
-                polygons.append(tuple(ordered_points[:-1]))
-                # current line is the last line of the polygon we just
-                # finished defining. We switch to the next line, which will
-                # be the first of the new polygon
-                current_line = iter_lines.pop()
-                ordered_points = [*current_line]
-            else:
-                # if it happens then the algorithm has a mistake
-                raise ValueError(
-                    f'no candidate line for {current_line} in {iter_lines}')
-
-    # add the last polygon
-    polygons.append(tuple(ordered_points[:-1]))
-
-    bounding_boxes = [bounding_box(polygon) for polygon in polygons]
-    bbox_with_x_min = np.argmin([bbox[0] for bbox in bounding_boxes])
-    bbox_with_x_max = np.argmax([bbox[1] for bbox in bounding_boxes])
-    bbox_with_y_min = np.argmin([bbox[2] for bbox in bounding_boxes])
-    bbox_with_y_max = np.argmax([bbox[3] for bbox in bounding_boxes])
-    if not (bbox_with_x_min == bbox_with_x_max
-            == bbox_with_y_min == bbox_with_y_max):
+    # candidates for the next line: lines of the same label starting at the
+    # end of each line
+    first_candidates = np.searchsorted(start_keys, end_keys, side='left')
+    n_candidates = (np.searchsorted(start_keys, end_keys, side='right')
+                    - first_candidates)
+    open_ends = np.isin(ends[:, 0], open_end_xs)
+    wrong_n_candidates = np.logical_and(
+        ~open_ends, (n_candidates == 0) | (n_candidates > 2))
+    if np.any(wrong_n_candidates):
         # if it happens then the algorithm has a mistake
-        raise ValueError('something went wrong')
+        line_index = np.argmax(wrong_n_candidates)
+        raise ValueError(
+            f'no candidate line for {segments[line_index].tolist()}')
+
+    # when there are 2 candidates, pick the one turning left, i.e. with the
+    # smallest cross product (with the y axis pointing down)
+    directions = ends - starts
+    first_candidates = np.minimum(first_candidates, n_segments - 1)
+    second_candidates = np.minimum(first_candidates + 1, n_segments - 1)
+
+    def turn_direction(candidates: np.ndarray) -> np.ndarray:
+        return (directions[:, 0] * directions[candidates, 1]
+                - directions[:, 1] * directions[candidates, 0])
+
+    use_second = np.logical_and(
+        n_candidates == 2,
+        turn_direction(second_candidates) < turn_direction(first_candidates))
+    next_lines = np.where(use_second, second_candidates, first_candidates)
+    next_lines[open_ends] = -1
+
+    return starts, ends, segment_labels, next_lines.tolist()
+
+
+def _follow_polygons(
+        starts: np.ndarray,
+        segment_labels: np.ndarray,
+        next_lines: List[int],
+        visited: List[bool]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Follow the linked lines that are not visited yet, as closed
+    polygons. Each polygon starts with its smallest line left.
+    Return the polygons, as an (N, 2) int32 array of their points and the
+    offsets of each polygon in it, and the label of each polygon.
+    """
+    ordered_lines = []
+    polygon_offsets = [0]
+    polygon_first_lines = []
+    for first_line in range(len(next_lines)):
+        if visited[first_line]:
+            continue
+        line = first_line
+        while not visited[line]:
+            visited[line] = True
+            ordered_lines.append(line)
+            line = next_lines[line]
+        if line != first_line:
+            # if it happens then the algorithm has a mistake
+            raise ValueError(f'polygon starting at '
+                             f'{tuple(starts[first_line].tolist())} '
+                             f'is not closed')
+        polygon_offsets.append(len(ordered_lines))
+        polygon_first_lines.append(first_line)
 
-    outside_contours = minimal_polygon(polygons[bbox_with_x_min])
-    # define the inner contours in the same order as the outer contours (
-    # i.e. clockwise). The SVG utils will be responsible to implement
-    # order-dependent rendering logic.
-    inner_holes = tuple(minimal_polygon(polygon)[::-1]
-                        for i, polygon in enumerate(polygons)
-                        if i != bbox_with_x_min)
+    return (starts[ordered_lines].astype(np.int32).reshape(-1, 2),
+            np.array(polygon_offsets, dtype=np.int64),
+            segment_labels[polygon_first_lines])
 
-    return Contours(outside_contours, inner_holes)
+
+def _chain_segments(
+        segments: np.ndarray,
+        segment_labels: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Chain the contour lines of one or several blobs into closed polygons,
+    in linear time (see `_link_segments`).
+    Each polygon starts with its smallest line, so the polygons only depend
+    on the set of lines.
+    Return the polygons sorted by label, as an (N, 2) int32 array of their
+    points and the offsets of each polygon in it, and the label of each
+    polygon.
+    """
+    starts, _, segment_labels, next_lines = _link_segments(segments,
+                                                           segment_labels)
+    return _follow_polygons(starts,
+                            segment_labels,
+                            next_lines,
+                            [False] * len(next_lines))
+
+
+def _polygons_to_labels_contours(
+        vertices: np.ndarray,
+        polygon_offsets: np.ndarray,
+        polygon_labels: np.ndarray) -> Dict[int, Contours]:
+    """Build the contours of each label from the polygons of
+    `_chain_segments`, for all the labels at once: for each label, the
+    polygon around all the others is the outside contour, and the other
+    ones are the holes. Aligned points are removed like in
+    `minimal_polygon_array`.
+    """
+    n_polygons = len(polygon_labels)
+    if n_polygons == 0:
+        return {}
+    polygon_starts = polygon_offsets[:-1]
+    polygon_ends = polygon_offsets[1:]
+
+    # remove the aligned points of all the polygons at once
+    vertex_indices = np.arange(len(vertices))
+    previous_indices = vertex_indices - 1
+    previous_indices[polygon_starts] = polygon_ends - 1
+    next_indices = vertex_indices + 1
+    next_indices[polygon_ends - 1] = polygon_starts
+    previous_points = vertices[previous_indices]
+    next_points = vertices[next_indices]
+    same_line = np.logical_or(
+        np.logical_and(previous_points[:, 0] == vertices[:, 0],
+                       vertices[:, 0] == next_points[:, 0]),
+        np.logical_and(previous_points[:, 1] == vertices[:, 1],
+                       vertices[:, 1] == next_points[:, 1]))
+
+    # polygons are sorted by label
+    label_ranks = np.zeros(n_polygons, dtype=np.int64)
+    np.cumsum(polygon_labels[1:] != polygon_labels[:-1], out=label_ranks[1:])
+    labels_first_polygons = np.concatenate([
+        [0], np.flatnonzero(np.diff(label_ranks)) + 1, [n_polygons]])
+
+    # the outside polygon of each label is the first one reaching all the
+    # sides of the bounding box of the label
+    polygon_indices = np.arange(n_polygons)
+
+    def first_polygon_with_min(values: np.ndarray) -> np.ndarray:
+        order = np.lexsort((polygon_indices, values, label_ranks))
+        return order[labels_first_polygons[:-1]]
+
+    outside_polygons = first_polygon_with_min(
+        np.minimum.reduceat(vertices[:, 0], polygon_starts))
+    for values in (-np.maximum.reduceat(vertices[:, 0], polygon_starts),
+                   np.minimum.reduceat(vertices[:, 1], polygon_starts),
+                   -np.maximum.reduceat(vertices[:, 1], polygon_starts)):
+        if np.any(first_polygon_with_min(values) != outside_polygons):
+            # if it happens then the algorithm has a mistake
+            raise ValueError('something went wrong')
+    is_hole = np.ones(n_polygons, dtype=bool)
+    is_hole[outside_polygons] = False
+
+    # put the outside polygon of each label first. Define the inner contours
+    # in the same order as the outer contours (i.e. clockwise) by reversing
+    # them. The SVG utils will be responsible to implement order-dependent
+    # rendering logic.
+    vertex_polygons = np.repeat(polygon_indices, np.diff(polygon_offsets))
+    vertex_positions = vertex_indices - polygon_starts[vertex_polygons]
+    vertex_positions[is_hole[vertex_polygons]] *= -1
+    kept_vertices = np.flatnonzero(~same_line)
+    vertex_order = np.lexsort((vertex_positions[kept_vertices],
+                               vertex_polygons[kept_vertices],
+                               is_hole[vertex_polygons[kept_vertices]],
+                               label_ranks[vertex_polygons[kept_vertices]]))
+    contours_vertices = vertices[kept_vertices[vertex_order]]
+
+    ring_order = np.lexsort((polygon_indices, is_hole, label_ranks))
+    ring_lengths = np.add.reduceat(~same_line, polygon_starts)[ring_order]
+    ring_offsets = np.concatenate([[0], np.cumsum(ring_lengths)])
+
+    labels_contours = {}
+    for first_ring, end_ring, label in zip(
+            labels_first_polygons[:-1].tolist(),
+            labels_first_polygons[1:].tolist(),
+            polygon_labels[labels_first_polygons[:-1]].tolist()):
+        first_vertex = ring_offsets[first_ring]
+        end_vertex = ring_offsets[end_ring]
+        labels_contours[label] = Contours.from_arrays(
+            contours_vertices[first_vertex:end_vertex],
+            ring_offsets[first_ring:end_ring + 1] - first_vertex)
+
+    return labels_contours
+
+
+def calculate_blob_contours(blob: np.ndarray) -> Contours:
+    labels_contours = calculate_labels_contours(
+        (blob != 0).astype(np.uint8))
+    return labels_contours[1]
+
+
+def calculate_labels_contours(labels: np.ndarray) -> Dict[int, Contours]:
+    """Calculate the contours of all the blobs of a label image in a single
+    pass (label 0 is ignored). The result for each label is the same as
+    calling `calculate_blob_contours` on the blob of that label.
+    """
+    return _polygons_to_labels_contours(
+        *_chain_segments(*_get_contour_segments(labels)))
@@ -1,4 +1,7 @@
-from typing import Tuple
+import os
+from contextlib import contextmanager
+from io import BytesIO
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
 
 import numpy as np
 from PIL import Image
@@ -7,21 +10,137 @@ PixelRGBA = Tuple[int, int, int, int]
 PixelRGB = Tuple[int, int, int]
 TRUE_TRANSPARENT: PixelRGBA = (255, 255, 255, 0)
 
-
-def read_image(image_path: str) -> np.ndarray:
-    image = Image.open(image_path)
+ImageInput = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO,
+                   Image.Image, np.ndarray]
+
+
+def _copy_image_pixels(image: Image.Image,
+                       pixels_array: np.ndarray,
+                       lut: Optional[np.ndarray] = None):
+    """Copy the pixels of the image to an array in PIL Y/X convention,
+    optionally mapped through a lookup table.
+    """
+    width, height = image.size
+    # copy the pixels by bands of rows: converting the whole image to an
+    # array would hold up to two other copies of the pixels at once
+    band_height = max(1, 2 ** 20 // width)
+    for top in range(0, height, band_height):
+        bottom = min(top + band_height, height)
+        band = np.asarray(image.crop((0, top, width, bottom)))
+        pixels_array[top:bottom] = band if lut is None else lut[band]
+
+
+def image_to_rgba_array(image: Image.Image) -> np.ndarray:
+    """Return the pixels of the image as an RGBA array, in usual X/Y
+    convention.
+    RGBA images are not converted, and their pixels are copied only once.
+    """
     mode = image.mode
-    rgba_image = image.convert('RGBA')
-    image.close()
-    # convert from PIL Y/X convention to usual X/Y convention
-    rgba_array = np.swapaxes(np.array(rgba_image), 0, 1)
-    rgba_image.close()
+    rgba_image = image if mode == 'RGBA' else image.convert('RGBA')
+    width, height = rgba_image.size
+    rgba_array = np.empty((height, width, 4), dtype=np.uint8)
+    _copy_image_pixels(rgba_image, rgba_array)
+    if rgba_image is not image:
+        rgba_image.close()
     # make sure there is only one transparent BG color if original mode is RGBA
     if mode == 'RGBA':
-        rgba_array[rgba_array[:, :, 3] == 0] = TRUE_TRANSPARENT
+        # whole pixels are written through a uint32 view, since a boolean
+        # index would be converted to arrays of indices
+        np.copyto(rgba_array.view(np.uint32)[:, :, 0],
+                  np.array(TRUE_TRANSPARENT, dtype=np.uint8).view(np.uint32),
+                  where=rgba_array[:, :, 3] == 0)
+    # convert from PIL Y/X convention to usual X/Y convention: the axes are
+    # swapped in a view, the downstream stages handle its memory layout
+    return np.swapaxes(rgba_array, 0, 1)
+
+
+def palette_image_to_color_indices(
+        image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the color indices of the pixels of a 'P' mode image, in usual
+    X/Y convention, and the RGBA colors of the indices.
+    The palette indices are renumbered so that each color has a single
+    index, and 0 is only the index of the (0, 0, 0, 0) color, like its ID
+    in `rgba_array_to_id_array`: blobs of same index are blobs of same
+    color.
+    """
+    # convert all the indices like the pixels of the image would be
+    palette_image = Image.frombytes('P', (256, 1), bytes(range(256)))
+    palette_mode = image.palette.mode if image.palette else 'RGB'
+    palette_image.putpalette(image.getpalette(palette_mode), palette_mode)
+    palette_image.info = image.info.copy()
+    with palette_image.convert('RGBA') as palette_rgba_image:
+        palette_ids = rgba_array_to_id_array(np.asarray(palette_rgba_image))
+
+    colors_ids, indices_lut = np.unique(palette_ids[0], return_inverse=True)
+    if colors_ids[0] != 0:
+        colors_ids = np.concatenate([[0], colors_ids])
+        indices_lut += 1
+    indices_dtype = np.uint8 if len(colors_ids) <= 256 else np.uint16
+
+    width, height = image.size
+    color_indices = np.empty((height, width), dtype=indices_dtype)
+    _copy_image_pixels(image, color_indices, indices_lut.astype(indices_dtype))
+    return (np.swapaxes(color_indices, 0, 1),
+            id_array_to_rgba_array(colors_ids))
+
+
+@contextmanager
+def _open_image(image: ImageInput) -> Iterator[Image.Image]:
+    if isinstance(image, Image.Image):
+        yield image
+        return
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        # BytesIO shares the buffer of `bytes` objects instead of copying it
+        image = BytesIO(image)
+    with Image.open(image) as opened_image:
+        yield opened_image
+
+
+def read_image(image_path: Union[str, os.PathLike, BinaryIO]) -> np.ndarray:
+    with Image.open(image_path) as image:
+        return image_to_rgba_array(image)
+
+
+def _rgba_array(image: np.ndarray) -> np.ndarray:
+    if image.ndim != 3 or image.shape[2] not in (3, 4):
+        raise ValueError(f'expected an RGBA or RGB array, '
+                         f'got an array of shape {image.shape}')
+    rgba_array = image.astype(np.uint8, copy=False)
+    if rgba_array.shape[2] == 3:
+        alpha_channel = np.full((*rgba_array.shape[:2], 1), 255, np.uint8)
+        rgba_array = np.concatenate([rgba_array, alpha_channel], axis=2)
     return rgba_array
 
 
+def load_image(image: ImageInput) -> np.ndarray:
+    """Return the RGBA array of an image given as:
+    - a path or a binary file object
+    - encoded image data (`bytes`, `bytearray` or `memoryview`)
+    - a `PIL.Image.Image`
+    - an RGBA or RGB uint8 array in X/Y convention (like the arrays returned
+      by `read_image`), returned as is if it is RGBA
+    """
+    if isinstance(image, np.ndarray):
+        return _rgba_array(image)
+    with _open_image(image) as pil_image:
+        return image_to_rgba_array(pil_image)
+
+
+def load_indexed_image(
+        image: ImageInput) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Same as `load_image`, but 'P' mode images are not expanded to RGBA:
+    their color indices and the RGBA colors of the indices are returned
+    (see `palette_image_to_color_indices`).
+    For the other images, the RGBA array and None are returned.
+    """
+    if isinstance(image, np.ndarray):
+        return _rgba_array(image), None
+    with _open_image(image) as pil_image:
+        if pil_image.mode == 'P':
+            return palette_image_to_color_indices(pil_image)
+        return image_to_rgba_array(pil_image), None
+
+
 def int_to_bytes(x: int, n_bytes=None) -> bytes:
     if n_bytes is None:
         n_bytes = (x.bit_length() + 7) // 8
@@ -35,46 +154,34 @@ def int_from_bytes(xbytes: bytes) -> int:
 
 
 def rgba_to_id(rgba_val: PixelRGBA) -> int:
-    return int_from_bytes(b''.join([int_to_bytes(val) for val in rgba_val]))
+    r, g, b, a = (int(val) for val in rgba_val)
+    return (r << 24) | (g << 16) | (b << 8) | a
 
 
 def id_to_rgba(label: int) -> PixelRGBA:
-    four_bytes = int_to_bytes(label, n_bytes=4)
-    return tuple(four_bytes)
+    return tuple(int(label).to_bytes(4, 'big'))
 
 
-def rgba_array_to_id_array(rgba_array: np.ndarray) -> np.ndarray:
-    rgba_uint8 = rgba_array.astype(np.uint8)
-    id_uint32 = rgba_uint8[:, :, 0].astype(np.uint32)
-    id_uint32 = np.left_shift(id_uint32, 8) + rgba_uint8[:, :, 1]
-    id_uint32 = np.left_shift(id_uint32, 8) + rgba_uint8[:, :, 2]
-    id_uint32 = np.left_shift(id_uint32, 8) + rgba_uint8[:, :, 3]
-    return id_uint32
-
+# the ID of a color is its 4 RGBA bytes read as a big-endian uint32
+_ID_DTYPE = np.dtype('>u4')
 
-def id_array_to_rgba_array(id_array: np.ndarray) -> np.ndarray:
-    rgba = id_array.astype(np.uint32)
-    _rgb = np.right_shift(rgba, 8)
-    __rg = np.right_shift(_rgb, 8)
-    ___r = np.right_shift(__rg, 8)
 
-    __r_ = np.left_shift(___r, 8)
-    _r__ = np.left_shift(__r_, 8)
-    r___ = np.left_shift(_r__, 8)
-
-    ___g = __rg - __r_
-    __g_ = np.left_shift(___g, 8)
-    _g__ = np.left_shift(__g_, 8)
-
-    ___b = _rgb - _r__ - __g_
-    __b_ = np.left_shift(___b, 8)
-
-    ___a = rgba - r___ - _g__ - __b_
+def rgba_array_to_id_array(rgba_array: np.ndarray) -> np.ndarray:
+    """Return the uint32 IDs of an array of RGBA colors of any shape
+    (..., 4), e.g. an image or a list of colors.
+    """
+    rgba_uint8 = rgba_array.astype(np.uint8, copy=False)
+    if rgba_uint8.strides[-1] != 1:
+        rgba_uint8 = np.ascontiguousarray(rgba_uint8)
+    # the 4 bytes of each pixel are reinterpreted without copying them,
+    # then converted to the native byte order in a single pass
+    return rgba_uint8.view(_ID_DTYPE)[..., 0].astype(np.uint32)
 
-    r, g, b, a = (array.astype(np.uint8)
-                  for array in (___r, ___g, ___b, ___a))
 
-    return np.stack([r, g, b, a], axis=-1)
+def id_array_to_rgba_array(id_array: np.ndarray) -> np.ndarray:
+    """Return the RGBA colors (..., 4) of an array of IDs of any shape."""
+    id_big_endian = id_array.astype(_ID_DTYPE)[..., np.newaxis]
+    return id_big_endian.view(np.uint8)
 
 
 def rgb_color_to_hex_code(color: PixelRGB) -> str:
@@ -1,8 +1,11 @@
+from typing import Optional, Tuple
+
 import cc3d
 import numpy as np
 from scipy import ndimage
 
-from pixels2svg.utils.pixel import (TRUE_TRANSPARENT, id_to_rgba,
+from pixels2svg.utils.blobs import LabelledImage
+from pixels2svg.utils.pixel import (id_array_to_rgba_array,
                                     rgba_array_to_id_array)
 
 # grayscale = 0.3 * R + 0.59 * G + 0.11 * B
@@ -17,13 +20,14 @@ R_TOLERANCE_UNIT = B_TOLERANCE_UNIT * GRAYSCALE_B / GRAYSCALE_R
 
 def _reduce_colors(rgba_array: np.ndarray, tolerance: int = 0) -> np.ndarray:
 
-    alpha_channel_values = set(np.unique(rgba_array[:, :, 3]))
-    if 0 in alpha_channel_values:
-        alpha_channel_values.remove(0)
-    if len(alpha_channel_values) == 0:
+    alpha_channel = rgba_array[:, :, 3]
+    max_alpha = int(alpha_channel.max())
+    if max_alpha == 0:
         # image is empty
         return rgba_array
-    alpha_channel_range = max(alpha_channel_values) - min(alpha_channel_values)
+    min_alpha = int(np.min(alpha_channel, where=alpha_channel > 0,
+                           initial=255))
+    alpha_channel_range = max_alpha - min_alpha
     a_tolerance_unit = alpha_channel_range / 255 / 5
 
     reduction_factors = [
@@ -36,82 +40,214 @@ def _reduce_colors(rgba_array: np.ndarray, tolerance: int = 0) -> np.ndarray:
         )
     ]
 
-    reduced_colors = rgba_array.astype(np.float64)
+    # reduce the 256 possible values of each channel once, then look the
+    # pixels up in these tables instead of computing on a float64 copy
+    channel_values = np.arange(256, dtype=np.float64)
+    reduced_values_luts = []
     for i in range(4):
-        channel = reduced_colors[:, :, i]
-        reduced_colors[:, :, i] = channel // reduction_factors[i]
+        reduced_values = channel_values // reduction_factors[i]
         if i == 3:
-            channel_non_zero = (channel > 0).astype(np.float64)
-            channel_non_zero[reduced_colors[:, :, i] == 255] = 0
-            reduced_colors[:, :, i] += channel_non_zero
-
-    return reduced_colors.astype(np.uint8)
+            channel_non_zero = (reduced_values > 0).astype(np.float64)
+            channel_non_zero[reduced_values == 255] = 0
+            reduced_values += channel_non_zero
+        reduced_values_luts.append(reduced_values.astype(np.uint8))
+
+    # look up by bands of rows: the uint8 values are converted to intp
+    # indices
+    reduced_colors = np.empty_like(rgba_array, dtype=np.uint8)
+    band_width = max(1, 2 ** 16 // rgba_array.shape[1])
+    for start in range(0, rgba_array.shape[0], band_width):
+        band = slice(start, start + band_width)
+        for i, reduced_values_lut in enumerate(reduced_values_luts):
+            reduced_colors[band, :, i] = np.take(reduced_values_lut,
+                                                 rgba_array[band, :, i])
+
+    return reduced_colors
+
+
+def _percentiles_by_group(values: np.ndarray,
+                          group_offsets: np.ndarray,
+                          percentiles: Tuple[float, ...]) -> np.ndarray:
+    """Return the percentiles (n_percentiles, n_groups) of each group of
+    consecutive values starting at `group_offsets`.
+    The groups of same size are computed together with `np.percentile`,
+    which gives exactly the same results as computing them one by one.
+    """
+    group_sizes = np.diff(np.append(group_offsets, len(values)))
+    group_percentiles = np.empty((len(percentiles), len(group_offsets)))
+    for size in np.unique(group_sizes).tolist():
+        groups = np.flatnonzero(group_sizes == size)
+        groups_values = values[group_offsets[groups, np.newaxis]
+                               + np.arange(size)]
+        group_percentiles[:, groups] = np.percentile(groups_values,
+                                                     percentiles,
+                                                     axis=1)
+    return group_percentiles
+
+
+def _touching_blobs_of_same_color(labels: np.ndarray,
+                                  id_array: np.ndarray) -> bool:
+    """Return whether 2 different blobs of `labels` have the same color
+    and touch each other, i.e. would be merged if labelled again."""
+    for first, second in (((slice(None, -1), slice(None)),
+                           (slice(1, None), slice(None))),
+                          ((slice(None), slice(None, -1)),
+                           (slice(None), slice(1, None)))):
+        if np.any(np.logical_and(labels[first] != labels[second],
+                                 id_array[first] == id_array[second])):
+            return True
+    return False
 
 
 def apply_color_tolerance(rgba_array: np.ndarray,
                           tolerance: int = 0) -> np.ndarray:
-    orig_colors_id_array = rgba_array_to_id_array(rgba_array)
+    return apply_color_tolerance_labelled(LabelledImage(rgba_array),
+                                          tolerance).rgba_array
+
+
+def apply_color_tolerance_labelled(image: LabelledImage,
+                                   tolerance: int = 0) -> LabelledImage:
+    """Same as `apply_color_tolerance`, reusing the color IDs of the image
+    if they are known. The labels of the blobs of reduced colors are
+    reused as the labels of the result if no blobs of same color touch.
+    """
+    orig_colors_id_array = image.id_array
 
-    reduced_colors = _reduce_colors(rgba_array, tolerance)
-    reduced_colors_id_array = rgba_array_to_id_array(reduced_colors)
+    # the result is C-contiguous like the labels of its blobs: labelling it
+    # again would give the same label numbers
+    reduced_colors = _reduce_colors(image.rgba_array, tolerance)
+    reduced_colors_id_array = np.ascontiguousarray(
+        rgba_array_to_id_array(reduced_colors))
     labels = cc3d.connected_components(reduced_colors_id_array,
                                        out_dtype=np.uint64,
                                        connectivity=4)
 
-    reduced_rgba_colors = np.zeros(rgba_array.shape, np.uint8)
-
-    for _, blob_shape in cc3d.each(labels, binary=True, in_place=True):
-        (similar_color_ids,
-         similar_color_ids_areas) = np.unique(orig_colors_id_array[blob_shape],
-                                              return_counts=True)
-        sorted_ids_by_area = sorted(zip(similar_color_ids,
-                                        similar_color_ids_areas),
-                                    key=lambda c: c[1],
-                                    reverse=True)
-        sorted_rgba_colors_by_area = [id_to_rgba(int(color_id))
-                                      for color_id, _ in sorted_ids_by_area]
-
-        alpha_values = [rgba[3] for rgba in sorted_rgba_colors_by_area]
-
-        percentile_90 = np.percentile(alpha_values, 90)
-        percentile_75 = np.percentile(alpha_values, 75)
-        percentile_25 = np.percentile(alpha_values, 25)
-
-        main_color_rgba = None
-        for rgba_color in sorted_rgba_colors_by_area:
-            alpha = rgba_color[3]
-            if (alpha > percentile_90
-                    or (percentile_25 <= alpha <= percentile_75)):
-                main_color_rgba = rgba_color
-                break
-        if main_color_rgba is None:
-            main_color_rgba = sorted_rgba_colors_by_area[0]
+    # count the pixels of each original color in each blob at once: the
+    # (label, color ID) pairs are sorted by label, then by color ID
+    pair_keys, pair_areas = np.unique(
+        np.bitwise_or(np.left_shift(labels, np.uint64(32)),
+                      orig_colors_id_array),
+        return_counts=True)
+    pair_labels = pair_keys >> np.uint64(32)
+    pair_color_ids = (pair_keys & np.uint64(0xffffffff)).astype(np.uint32)
+    pair_alphas = (pair_color_ids & 0xff).astype(np.int64)
+
+    # the colors of each blob are sorted by area (then by ID), and the main
+    # color is the first one whose alpha is above the 90th percentile or
+    # between the 25th and 75th percentiles of the alphas of the blob's
+    # colors, or the largest one if there is none
+    order = np.lexsort((pair_color_ids, -pair_areas, pair_labels))
+    sorted_pair_labels = pair_labels[order]
+    blob_offsets = np.flatnonzero(
+        np.r_[True, sorted_pair_labels[1:] != sorted_pair_labels[:-1]])
+    alpha_order = np.lexsort((pair_alphas, pair_labels))
+    (percentile_90,
+     percentile_75,
+     percentile_25) = np.repeat(
+        _percentiles_by_group(pair_alphas[alpha_order],
+                              blob_offsets,
+                              (90, 75, 25)),
+        np.diff(np.append(blob_offsets, len(order))),
+        axis=1)
+    sorted_alphas = pair_alphas[order]
+    is_main_color_candidate = np.logical_or(
+        sorted_alphas > percentile_90,
+        np.logical_and(percentile_25 <= sorted_alphas,
+                       sorted_alphas <= percentile_75))
+    first_candidates = np.minimum.reduceat(
+        np.where(is_main_color_candidate, np.arange(len(order)), len(order)),
+        blob_offsets)
+    main_colors = np.where(first_candidates < len(order),
+                           first_candidates,
+                           blob_offsets)
+
+    labels_main_color_ids = np.zeros(int(pair_labels[-1]) + 1,
+                                     dtype=np.uint32)
+    labels_main_color_ids[sorted_pair_labels[main_colors]] = \
+        pair_color_ids[order][main_colors]
+    # the pixels of label 0, of color (0, 0, 0, 0) once reduced, are left
+    # transparent
+    labels_main_color_ids[0] = 0
+
+    id_array = labels_main_color_ids[labels]
+    if _touching_blobs_of_same_color(labels, id_array):
+        labels = None
+    return LabelledImage(id_array_to_rgba_array(id_array), id_array, labels)
+
+
+def _downscale(gray: np.ndarray, factor: int) -> np.ndarray:
+    """Average the pixels of `gray` by blocks of `factor` x `factor`
+    pixels (smaller at the right and bottom borders)."""
+    block_sums = gray.astype(np.float64)
+    block_counts = np.ones((1, 1))
+    for axis in (0, 1):
+        offsets = np.arange(0, gray.shape[axis], factor)
+        block_sums = np.add.reduceat(block_sums, offsets, axis=axis)
+        block_counts = block_counts * np.expand_dims(
+            np.diff(offsets, append=gray.shape[axis]), 1 - axis)
+    return np.around(block_sums / block_counts).astype(np.uint8)
+
+
+def _estimate_background_masks(
+        gray: np.ndarray,
+        blur_quantity: float) -> Tuple[np.ndarray, np.ndarray]:
+    blurred = ndimage.gaussian_filter(gray, sigma=blur_quantity)
+    contours = ndimage.filters.sobel(blurred)
 
-        reduced_rgba_colors[blob_shape, :] = main_color_rgba
+    # create base mask (take pretty bright contours)
+    base_mask = contours > np.percentile(contours, 50)
+    # fill any hole created by interconnected contours
+    # (blobs can still contain holes at this point if they touch the borders)
+    base_mask = ndimage.binary_fill_holes(base_mask)
 
-    return reduced_rgba_colors
+    # dilate base mask
+    dilated_mask = ndimage.gaussian_filter(
+        base_mask.astype(np.uint8) * 255, sigma=blur_quantity)
+    dilated_mask = dilated_mask > np.percentile(dilated_mask, 20)
+    return base_mask, dilated_mask
 
 
 def remove_background(rgba_array: np.ndarray,
                       background_tolerance: float = 1.0,
-                      maximal_non_bg_artifact_size: float = 2.0) -> np.ndarray:
-    """Background removal technique:
+                      maximal_non_bg_artifact_size: float = 2.0,
+                      mask_size: Optional[int] = None) -> np.ndarray:
+    return remove_background_labelled(
+        LabelledImage(rgba_array),
+        background_tolerance,
+        maximal_non_bg_artifact_size,
+        mask_size).rgba_array
+
+
+def remove_background_labelled(
+        image: LabelledImage,
+        background_tolerance: float = 1.0,
+        maximal_non_bg_artifact_size: float = 2.0,
+        mask_size: Optional[int] = None) -> LabelledImage:
+    """Same as `remove_background`, reusing the labels of the image if they
+    are known. The background blobs are cleared in place.
+
+    Background removal technique:
     1) Create a first base mask using contour detection
     2) Dilate that mask to get the 'maximum area' where we will consider
        non-background pixels
     3) Group adjacent pixels of same color in blobs
-    4) Iterate through each blob and consider it non-background if:
+    4) Consider each blob non-background if:
        - most of its pixels are inside the base mask
        - or most of its pixels are inside the dilated mask AND its area is
          below a certain threshold (a few % of the image area)
 
+    If `mask_size` is passed and the image is larger, the masks of 1) and
+    2) are estimated on the image downscaled so that its largest side is
+    at most `mask_size` pixels, and upscaled back: the blurs are much
+    faster, for nearly the same masks.
     """
+    rgba_array = image.rgba_array
     min_alpha = rgba_array[:, :, 3].min()
     if min_alpha < 95 / 100 * 255:
         # no background removal if background has pixels with alpha
         # (tolerate pixels with an alpha 0.95 < a < 1 to allow human mistakes
         # at creation time in some image editing software)
-        return rgba_array
+        return image
 
     gray = np.zeros(rgba_array.shape[:2], np.float64)
     gray += rgba_array[:, :, 0] * GRAYSCALE_R
@@ -125,46 +261,40 @@ def remove_background(rgba_array: np.ndarray,
     blur_quantity = background_tolerance / 128 * width
     non_bg_area_threshold = maximal_non_bg_artifact_size / 100 * width * height
 
-    blurred = ndimage.gaussian_filter(gray, sigma=blur_quantity)
-    contours = ndimage.filters.sobel(blurred)
-
-    # create base mask (take pretty bright contours)
-    base_mask = contours > np.percentile(contours, 50)
-    # fill any hole created by interconnected contours
-    # (blobs can still contain holes at this point if they touch the borders)
-    base_mask = ndimage.binary_fill_holes(base_mask)
-
-    # dilate base mask
-    dilated_mask = ndimage.gaussian_filter(
-        base_mask.astype(np.uint8) * 255, sigma=blur_quantity)
-    dilated_mask = dilated_mask > np.percentile(dilated_mask, 20)
-
-    # calculate connected blobs of same RGBA color
-    colors_id_array = rgba_array_to_id_array(rgba_array)
-    labels = cc3d.connected_components(colors_id_array,
-                                       out_dtype=np.uint64,
-                                       connectivity=4)
-
-    final_mask = np.ones(labels.shape, dtype=bool)
-
-    # iterate through blobs
-    for blob_id, blob_shape in cc3d.each(labels, binary=True, in_place=True):
-
-        base_mask_overlap = np.count_nonzero(
-            np.logical_and(blob_shape, base_mask))
-        shape_area = np.count_nonzero(blob_shape)
-
-        # most pixels are in the base mask
-        if base_mask_overlap > 0.5 * shape_area:
-            final_mask[blob_shape] = False
-            continue
-
-        # most pixels are in the dilated mask AND blob is small enough
-        dilated_mask_overlap = np.count_nonzero(
-            np.logical_and(blob_shape, dilated_mask))
-        if (dilated_mask_overlap > 0.5 * shape_area
-                and shape_area < non_bg_area_threshold):
-            final_mask[blob_shape] = False
-
-    rgba_array[final_mask, :] = TRUE_TRANSPARENT
-    return rgba_array
+    if mask_size is not None and max(width, height) > mask_size:
+        # estimate the masks on the image downscaled by an integer factor,
+        # with the blur scaled accordingly, and upscale them back
+        factor = -(-max(width, height) // mask_size)
+        base_mask, dilated_mask = _estimate_background_masks(
+            _downscale(gray, factor), blur_quantity / factor)
+        x_indices = np.arange(width) // factor
+        y_indices = np.arange(height) // factor
+        base_mask = base_mask[x_indices[:, np.newaxis], y_indices]
+        dilated_mask = dilated_mask[x_indices[:, np.newaxis], y_indices]
+    else:
+        base_mask, dilated_mask = _estimate_background_masks(gray,
+                                                             blur_quantity)
+
+    # connected blobs of same RGBA color
+    labels = image.labels
+
+    # count the pixels of each blob, and those inside each mask, for all
+    # the blobs at once (`bincount` only casts uint64 labels implicitly
+    # since numpy 2.1)
+    labels_areas = cc3d.statistics(labels)['voxel_counts']
+    base_mask_overlaps = np.bincount(labels[base_mask].astype(np.intp),
+                                     minlength=len(labels_areas))
+    dilated_mask_overlaps = np.bincount(labels[dilated_mask].astype(np.intp),
+                                        minlength=len(labels_areas))
+
+    # most pixels are in the base mask
+    # or most pixels are in the dilated mask AND blob is small enough
+    non_bg_labels = np.logical_or(
+        base_mask_overlaps > 0.5 * labels_areas,
+        np.logical_and(dilated_mask_overlaps > 0.5 * labels_areas,
+                       labels_areas < non_bg_area_threshold))
+    non_bg_labels[0] = False
+    final_mask = ~non_bg_labels[labels]
+
+    image.clear(final_mask)
+    return image
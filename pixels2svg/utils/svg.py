@@ -1,13 +1,18 @@
-from io import StringIO
-from typing import Optional, Tuple, Union
+import os
+from contextlib import contextmanager
+from io import BufferedIOBase, RawIOBase, StringIO, TextIOWrapper
+from typing import BinaryIO, Iterator, Optional, TextIO, Tuple, Union
 
+import numpy as np
 from svgwrite import Drawing as SVGDrawing
 from svgwrite.container import Group
 from svgwrite.path import Path
 
-from pixels2svg.utils.geometry import Polygon
+from pixels2svg.utils.geometry import Contours, Polygon
 from pixels2svg.utils.pixel import PixelRGB, PixelRGBA, rgb_color_to_hex_code
 
+SVGOutput = Union[str, os.PathLike, TextIO, BinaryIO]
+
 
 class Drawing(SVGDrawing):
     def __init__(self, width: int, height: int):
@@ -29,6 +34,105 @@ class Drawing(SVGDrawing):
         return svg_str
 
 
+class SVGWriter:
+
+    HEADER = ('<?xml version="1.0" encoding="utf-8" ?>\n'
+              '<svg baseProfile="full" height="{height}px" version="1.1" '
+              'viewBox="0 0 {width} {height}" width="{width}px" '
+              'xmlns="http://www.w3.org/2000/svg" '
+              'xmlns:ev="http://www.w3.org/2001/xml-events" '
+              'xmlns:xlink="http://www.w3.org/1999/xlink"><defs />')
+
+    PRETTY_HEADER = ('<?xml version="1.0" encoding="utf-8" ?>\n'
+                     '<svg xmlns="http://www.w3.org/2000/svg" '
+                     'xmlns:ev="http://www.w3.org/2001/xml-events" '
+                     'xmlns:xlink="http://www.w3.org/1999/xlink" '
+                     'baseProfile="full" height="{height}px" version="1.1" '
+                     'viewBox="0 0 {width} {height}" width="{width}px">\n'
+                     '  <defs/>\n')
+
+    def __init__(self,
+                 fileobj: TextIO,
+                 width: int,
+                 height: int,
+                 pretty: bool = False,
+                 indent: int = 2):
+        """Write SVG code directly to a text stream, without building
+        svgwrite elements: each element is written as soon as it is added.
+        The output is the same as
+        `Drawing(width, height).write(fileobj, pretty=pretty)` with the same
+        groups and paths added.
+        """
+        self.fileobj: TextIO = fileobj
+        self.pretty: bool = pretty
+        self.indent: int = indent
+        self.depth: int = 1
+        header = self.PRETTY_HEADER if pretty else self.HEADER
+        self.fileobj.write(header.format(width=width, height=height))
+
+    def _write_tag(self, tag: str, depth: int):
+        if self.pretty:
+            self.fileobj.write(f'{" " * (self.indent * depth)}{tag}\n')
+        else:
+            self.fileobj.write(tag)
+
+    def open_group(self, id: str):
+        self._write_tag(f'<g id="{id}">', self.depth)
+        self.depth += 1
+
+    def close_group(self):
+        self.depth -= 1
+        self._write_tag('</g>', self.depth)
+
+    def write_path(self,
+                   path_data: str,
+                   color: Union[PixelRGBA, PixelRGB, str],
+                   opacity: float = 1.0,
+                   id: Optional[str] = None):
+        hex_color, opacity = _color_to_hex_and_opacity(color, opacity)
+        id_attribute = f' id="{id}"' if id is not None else ''
+        end = '/>' if self.pretty else ' />'
+        self._write_tag(f'<path d="{path_data}" fill="{hex_color}" '
+                        f'fill-opacity="{opacity}"{id_attribute}{end}',
+                        self.depth)
+
+    def close(self):
+        self._write_tag('</svg>', 0)
+
+
+@contextmanager
+def open_text_output(output: SVGOutput) -> Iterator[TextIO]:
+    """Open `output` for writing SVG code: it can be a path, or an already
+    open text or binary file object (which is left open).
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'w', encoding='utf-8') as text_file:
+            yield text_file
+    elif isinstance(output, (BufferedIOBase, RawIOBase)):
+        text_output = TextIOWrapper(output, encoding='utf-8', newline='\n')
+        try:
+            yield text_output
+        finally:
+            text_output.flush()
+            text_output.detach()
+    else:
+        yield output
+
+
+def _points_to_path_data(points: np.ndarray) -> str:
+    # format all the integer coordinates in a single call
+    return f'M {"%d,%d " * len(points) % tuple(points.ravel().tolist())}z'
+
+
+def contours_to_path_data(contours: Contours) -> str:
+    """Same as `polygon_with_holes_to_path_data(contours.outside,
+    contours.inner_holes)`, from the contours arrays.
+    """
+    outside, *holes = contours.rings()
+    return ' '.join([_points_to_path_data(outside),
+                     *(_points_to_path_data(hole[::-1]) for hole in holes)])
+
+
 def polygon_to_path_data(polygon: Polygon) -> str:
     string_points = [f'{p[0]},{p[1]}' for p in polygon]
     data = f'M {" ".join(string_points)} z'
@@ -44,14 +148,8 @@ def polygon_with_holes_to_path_data(polygon: Polygon,
     return path_data
 
 
-def draw_path(svg: Union[Drawing, Group],
-              path_data: str,
-              color: Union[PixelRGBA, PixelRGB, str],
-              opacity: float = 1.0,
-              **extra_args):
-    """Draw a shape with fill color from a path data
-    """
-
+def _color_to_hex_and_opacity(color: Union[PixelRGBA, PixelRGB, str],
+                              opacity: float) -> Tuple[str, float]:
     if isinstance(color, str):
         hex_color = color
     elif isinstance(color, tuple):
@@ -60,7 +158,18 @@ def draw_path(svg: Union[Drawing, Group],
             opacity = color[3] / 255
     else:
         raise ValueError(f'unexpected value for color: {color}')
+    return hex_color, opacity
+
+
+def draw_path(svg: Union[Drawing, Group],
+              path_data: str,
+              color: Union[PixelRGBA, PixelRGB, str],
+              opacity: float = 1.0,
+              **extra_args):
+    """Draw a shape with fill color from a path data
+    """
 
+    hex_color, opacity = _color_to_hex_and_opacity(color, opacity)
     shape = Path(d=path_data, **extra_args)
     shape = shape.fill(hex_color, opacity=opacity)
     svg.add(shape)
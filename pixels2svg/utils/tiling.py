@@ -0,0 +1,212 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pixels2svg.utils.geometry import (Contours, _follow_polygons,
+                                       _get_contour_segments, _link_segments,
+                                       _polygons_to_labels_contours)
+
+# points of several polygons (or open chains of lines) as an (N, 2) int32
+# array, offsets of each polygon in it, and label of each polygon
+Polygons = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _empty_polygons(labels_dtype: np.dtype) -> Polygons:
+    return (np.zeros((0, 2), dtype=np.int32),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=labels_dtype))
+
+
+def _concatenate_polygons(polygons_list: List[Polygons]) -> Polygons:
+    vertices, offsets, labels = zip(*polygons_list)
+    first_vertices = np.cumsum([0, *(len(v) for v in vertices[:-1])])
+    return (np.concatenate(vertices),
+            np.concatenate([[0], *(o[1:] + first_vertex
+                                   for o, first_vertex
+                                   in zip(offsets, first_vertices))]),
+            np.concatenate(labels))
+
+
+def _trace_tile(labels: np.ndarray,
+                first_row: int,
+                end_row: int,
+                x_offset: int,
+                seam_xs: Tuple[int, ...]
+                ) -> Tuple[Polygons, Polygons, np.ndarray]:
+    """Chain the contour lines of the pixels of rows `first_row` to
+    `end_row` of `labels`, a slice of the label image starting at row
+    `x_offset` of the image.
+    The lines ending on a seam between two tiles are not linked, since
+    their next line can be in another tile: the chains of lines going from
+    a seam to another are returned separately from the closed polygons,
+    with the end point of each chain, to be stitched afterwards.
+    """
+    segments, segment_labels = _get_contour_segments(labels,
+                                                     first_row,
+                                                     end_row)
+    segments[:, :, 0] += x_offset
+    starts, ends, segment_labels, next_lines = _link_segments(segments,
+                                                              segment_labels,
+                                                              seam_xs)
+
+    # the chains start with the lines starting on a seam: the lines ending
+    # there are not linked
+    visited = [False] * len(next_lines)
+    chain_lines = []
+    chain_offsets = [0]
+    chain_last_lines = []
+    for first_line in np.flatnonzero(np.isin(starts[:, 0], seam_xs)).tolist():
+        line = first_line
+        while line != -1 and not visited[line]:
+            visited[line] = True
+            chain_lines.append(line)
+            last_line = line
+            line = next_lines[line]
+        if line != -1:
+            # if it happens then the algorithm has a mistake
+            raise ValueError(f'chain starting at '
+                             f'{tuple(starts[first_line].tolist())} '
+                             f'does not end on a seam')
+        chain_offsets.append(len(chain_lines))
+        chain_last_lines.append(last_line)
+
+    chain_first_lines = [chain_lines[offset] for offset in chain_offsets[:-1]]
+    chains = (starts[chain_lines].astype(np.int32).reshape(-1, 2),
+              np.array(chain_offsets, dtype=np.int64),
+              segment_labels[chain_first_lines])
+    chain_ends = ends[chain_last_lines].astype(np.int32).reshape(-1, 2)
+
+    closed_polygons = _follow_polygons(starts,
+                                       segment_labels,
+                                       next_lines,
+                                       visited)
+    return closed_polygons, chains, chain_ends
+
+
+def _stitch_chains(chains: Polygons, chain_ends: np.ndarray) -> Polygons:
+    """Link the chains of lines of all the tiles into closed polygons, with
+    the same rule as `_link_segments`, and start each polygon with its
+    smallest line.
+    """
+    vertices, offsets, labels = chains
+    n_chains = len(labels)
+    if n_chains == 0:
+        return _empty_polygons(labels.dtype)
+
+    first_points = vertices[offsets[:-1]]
+    last_points = vertices[offsets[1:] - 1]
+    second_points = np.where((np.diff(offsets) > 1)[:, np.newaxis],
+                             vertices[np.minimum(offsets[:-1] + 1,
+                                                 len(vertices) - 1)],
+                             chain_ends)
+    first_directions = (second_points - first_points).tolist()
+    last_directions = (chain_ends - last_points).tolist()
+
+    chain_labels = labels.tolist()
+    chains_by_start: Dict[Tuple[int, int, int], List[int]] = {}
+    for chain, (label, point) in enumerate(zip(chain_labels,
+                                               first_points.tolist())):
+        chains_by_start.setdefault((label, *point), []).append(chain)
+
+    next_chains = []
+    for chain, (label, point) in enumerate(zip(chain_labels,
+                                               chain_ends.tolist())):
+        candidates = chains_by_start.get((label, *point), [])
+        if len(candidates) not in (1, 2):
+            # if it happens then the algorithm has a mistake
+            raise ValueError(f'no candidate chain after {tuple(point)}')
+        # turn left, i.e. pick the smallest cross product
+        direction = last_directions[chain]
+        next_chains.append(min(
+            candidates,
+            key=lambda c: (direction[0] * first_directions[c][1]
+                           - direction[1] * first_directions[c][0])))
+
+    polygons_vertices = []
+    visited = [False] * n_chains
+    for first_chain in range(n_chains):
+        if visited[first_chain]:
+            continue
+        polygon_chains = []
+        chain = first_chain
+        while not visited[chain]:
+            visited[chain] = True
+            polygon_chains.append(vertices[offsets[chain]:
+                                           offsets[chain + 1]])
+            chain = next_chains[chain]
+        if chain != first_chain:
+            # if it happens then the algorithm has a mistake
+            raise ValueError('stitched polygon is not closed')
+        polygon_vertices = np.concatenate(polygon_chains)
+        next_vertices = np.roll(polygon_vertices, -1, axis=0)
+        smallest_line = np.lexsort((next_vertices[:, 1],
+                                    next_vertices[:, 0],
+                                    polygon_vertices[:, 1],
+                                    polygon_vertices[:, 0]))[0]
+        polygons_vertices.append((np.roll(polygon_vertices,
+                                          -smallest_line,
+                                          axis=0),
+                                  np.array([0, len(polygon_vertices)]),
+                                  labels[[first_chain]]))
+
+    return _concatenate_polygons(polygons_vertices)
+
+
+def _sort_polygons(polygons: Polygons) -> Polygons:
+    """Sort polygons by label then by first line, like `_chain_segments`.
+    """
+    vertices, offsets, labels = polygons
+    first_points = vertices[offsets[:-1]]
+    second_points = vertices[offsets[:-1] + 1]
+    order = np.lexsort((second_points[:, 1],
+                        second_points[:, 0],
+                        first_points[:, 1],
+                        first_points[:, 0],
+                        labels))
+
+    lengths = np.diff(offsets)[order]
+    sorted_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    vertex_indices = (np.repeat(offsets[:-1][order] - sorted_offsets[:-1],
+                                lengths)
+                      + np.arange(sorted_offsets[-1]))
+    return vertices[vertex_indices], sorted_offsets, labels[order]
+
+
+def calculate_labels_contours_tiled(
+        labels: np.ndarray,
+        n_tiles: int,
+        workers: Optional[int] = None) -> Dict[int, Contours]:
+    """Same as `geometry.calculate_labels_contours`, but the image is split
+    in `n_tiles` bands along its first axis, whose contours are traced in
+    parallel by a pool of `workers` processes (default: number of CPUs).
+    The shapes crossing the seams between the tiles are stitched back
+    together afterwards, so the result is identical.
+    """
+    width = labels.shape[0]
+    tile_bounds = np.unique(
+        np.linspace(0, width, max(1, min(n_tiles, width)) + 1).astype(int))
+    seam_xs = tuple(tile_bounds[1:-1].tolist())
+
+    tiles_args = []
+    for x_start, x_end in zip(tile_bounds[:-1].tolist(),
+                              tile_bounds[1:].tolist()):
+        # keep the neighbour rows of the tile to find its contours
+        slice_start = max(x_start - 1, 0)
+        slice_end = min(x_end + 1, width)
+        tiles_args.append((labels[slice_start:slice_end],
+                           x_start - slice_start,
+                           x_end - slice_start,
+                           slice_start,
+                           seam_xs))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tiles_contours = list(executor.map(_trace_tile, *zip(*tiles_args)))
+
+    closed_polygons, chains, chain_ends = zip(*tiles_contours)
+    stitched_polygons = _stitch_chains(_concatenate_polygons(chains),
+                                       np.concatenate(chain_ends))
+    polygons = _concatenate_polygons([*closed_polygons, stitched_polygons])
+    if len(polygons[2]) == 0:
+        return {}
+    return _polygons_to_labels_contours(*_sort_polygons(polygons))
@@ -0,0 +1,207 @@
+from typing import Dict, List, Optional, Tuple
+
+import cc3d
+import numpy as np
+
+from pixels2svg.utils import geometry, tiling
+from pixels2svg.utils.blobs import LabelledImage
+from pixels2svg.utils.geometry import Contours
+from pixels2svg.utils.pixel import (PixelRGBA, id_array_to_rgba_array,
+                                    rgba_array_to_id_array)
+
+
+class LabelsTrace:
+
+    def __init__(self,
+                 id_array: np.ndarray,
+                 labels: np.ndarray,
+                 labels_colors: List[PixelRGBA],
+                 labels_areas: np.ndarray,
+                 labels_contours: Dict[int, Contours],
+                 has_opacity: bool,
+                 palette: Optional[np.ndarray] = None):
+        """Contours of all the blobs of same color of an image, with the
+        color ID image, the label image, and the color and area of each
+        label, so that they can be updated after an edit of the image with
+        `retrace_labels`.
+        `labels_contours` is ordered by label, and transparent blobs have no
+        contours. `has_opacity` tells if some pixels are not fully opaque.
+        For palette images, `id_array` contains color indices, and
+        `palette` the RGBA colors of the indices.
+        """
+        self.id_array: np.ndarray = id_array
+        self.labels: np.ndarray = labels
+        self.labels_colors: List[PixelRGBA] = labels_colors
+        self.labels_areas: np.ndarray = labels_areas
+        self.labels_contours: Dict[int, Contours] = labels_contours
+        self.has_opacity: bool = has_opacity
+        self.palette: Optional[np.ndarray] = palette
+
+
+def _label_image(
+        id_array: np.ndarray,
+        palette: Optional[np.ndarray] = None,
+        labels: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, List[PixelRGBA], np.ndarray, np.ndarray, bool]:
+    """Return the label image of the blobs of same color (unless it is
+    passed), with the color, the area and whether it is transparent of each
+    label, and whether some pixels are not fully opaque.
+    """
+    if labels is None:
+        labels = cc3d.connected_components(id_array,
+                                           out_dtype=np.uint64,
+                                           connectivity=4)
+    # look up the area and color of all the labels at once: all the pixels
+    # of a label have the same color, so any of them gives the label color
+    labels_areas = cc3d.statistics(labels)['voxel_counts']
+    labels_color_ids = np.zeros(len(labels_areas), dtype=id_array.dtype)
+    labels_color_ids[labels] = id_array
+    if palette is None:
+        labels_rgba = id_array_to_rgba_array(labels_color_ids)
+    else:
+        labels_rgba = palette[labels_color_ids]
+    labels_colors = [tuple(color) for color in labels_rgba.tolist()]
+    transparent_labels = labels_rgba[:, 3] == 0
+    # the background label 0 has pixels only if some are (0, 0, 0, 0)
+    has_opacity = bool(np.any(labels_rgba[labels_areas > 0, 3] < 255))
+    return (labels,
+            labels_colors,
+            labels_areas,
+            transparent_labels,
+            has_opacity)
+
+
+def _calculate_labels_contours(labels: np.ndarray,
+                               workers: int = 1) -> Dict[int, Contours]:
+    # trace all the blobs at once instead of processing them one by one
+    if workers > 1:
+        return tiling.calculate_labels_contours_tiled(labels,
+                                                      workers,
+                                                      workers)
+    return geometry.calculate_labels_contours(labels)
+
+
+def _trace_id_array(id_array: np.ndarray,
+                    palette: Optional[np.ndarray] = None,
+                    workers: int = 1,
+                    labels: Optional[np.ndarray] = None) -> LabelsTrace:
+    (labels,
+     labels_colors,
+     labels_areas,
+     transparent_labels,
+     has_opacity) = _label_image(id_array, palette, labels)
+
+    # ignore transparent pixels
+    opaque_labels = labels.copy()
+    opaque_labels[transparent_labels[labels]] = 0
+
+    return LabelsTrace(id_array,
+                       labels,
+                       labels_colors,
+                       labels_areas,
+                       _calculate_labels_contours(opaque_labels, workers),
+                       has_opacity,
+                       palette)
+
+
+def trace_labels(rgba_array: np.ndarray, workers: int = 1) -> LabelsTrace:
+    """Trace the contours of all the blobs of same color of the image.
+    If `workers` > 1, the image is split in as many tiles traced in
+    parallel processes.
+    """
+    return _trace_id_array(rgba_array_to_id_array(rgba_array),
+                           workers=workers)
+
+
+def trace_labelled_image(image: LabelledImage,
+                         workers: int = 1) -> LabelsTrace:
+    """Same as `trace_labels(image.rgba_array)`, reusing the color IDs and
+    the labels of the image.
+    """
+    return _trace_id_array(image.id_array, workers=workers,
+                           labels=image.labels)
+
+
+def trace_palette_labels(color_indices: np.ndarray,
+                         palette: np.ndarray,
+                         workers: int = 1) -> LabelsTrace:
+    """Same as `trace_labels`, for an image given as color indices and the
+    RGBA colors of the indices (see
+    `pixel.palette_image_to_color_indices`): the blobs are labelled on the
+    indices, and the colors only looked up for the labels.
+    """
+    return _trace_id_array(color_indices, palette, workers)
+
+
+def retrace_labels(previous_trace: LabelsTrace,
+                   rgba_array: np.ndarray,
+                   workers: int = 1) -> LabelsTrace:
+    """Same as `trace_labels(rgba_array)`, but only the blobs touching the
+    pixels that changed since `previous_trace` are traced again: the
+    contours of the other blobs are reused.
+    """
+    id_array = rgba_array_to_id_array(rgba_array)
+    if (previous_trace.palette is not None
+            or id_array.shape != previous_trace.id_array.shape):
+        return _trace_id_array(id_array, workers=workers)
+    changed_pixels = id_array != previous_trace.id_array
+
+    (labels,
+     labels_colors,
+     labels_areas,
+     transparent_labels,
+     has_opacity) = _label_image(id_array)
+    previous_labels = previous_trace.labels
+
+    # the pixels of a blob without changed pixels all had the same previous
+    # label. The blob is the same as before if that previous blob had no
+    # changed pixels either (otherwise it had more pixels).
+    labels_previous_labels = np.zeros(len(labels_areas),
+                                      dtype=previous_labels.dtype)
+    labels_previous_labels[labels] = previous_labels
+    changed_labels = np.zeros(len(labels_areas), dtype=bool)
+    changed_labels[labels[changed_pixels]] = True
+    changed_previous_labels = np.zeros(len(previous_trace.labels_areas),
+                                       dtype=bool)
+    changed_previous_labels[previous_labels[changed_pixels]] = True
+    changed_labels |= changed_previous_labels[labels_previous_labels]
+
+    traced_labels = np.logical_and(changed_labels, ~transparent_labels)
+    traced_labels[0] = False
+    reused_labels = np.logical_and(~changed_labels, ~transparent_labels)
+    reused_labels[0] = False
+
+    # trace the changed blobs in the bounding box of their pixels only
+    traced_labels_contours = {}
+    traced_pixels = traced_labels[labels]
+    if np.any(traced_pixels):
+        x_indices = np.flatnonzero(np.any(traced_pixels, axis=1))
+        y_indices = np.flatnonzero(np.any(traced_pixels, axis=0))
+        bbox_slices = (slice(x_indices[0], x_indices[-1] + 1),
+                       slice(y_indices[0], y_indices[-1] + 1))
+        bbox_labels = np.where(traced_pixels[bbox_slices],
+                               labels[bbox_slices],
+                               0)
+        bbox_offset = np.array([x_indices[0], y_indices[0]], dtype=np.int32)
+        for label, contours in _calculate_labels_contours(
+                bbox_labels, workers).items():
+            traced_labels_contours[label] = Contours.from_arrays(
+                contours.vertices + bbox_offset,
+                contours.ring_offsets)
+
+    labels_contours = {}
+    for label, previous_label in zip(
+            np.flatnonzero(traced_labels | reused_labels).tolist(),
+            labels_previous_labels[traced_labels | reused_labels].tolist()):
+        if label in traced_labels_contours:
+            labels_contours[label] = traced_labels_contours[label]
+        else:
+            labels_contours[label] = \
+                previous_trace.labels_contours[previous_label]
+
+    return LabelsTrace(id_array,
+                       labels,
+                       labels_colors,
+                       labels_areas,
+                       labels_contours,
+                       has_opacity)
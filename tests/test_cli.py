@@ -0,0 +1,88 @@
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+from tests.base import FIXTURES_DIR, SWORD_PNG_PATH, TEST_DIR
+
+from pixels2svg.cli import batch_output_path, expand_input_paths, run_batch
+from pixels2svg.main import pixels2svg
+
+
+class TestCLI(unittest.TestCase):
+
+    def test_expand_input_paths(self):
+        banana_path = os.path.join(FIXTURES_DIR, 'banana.png')
+        input_paths = expand_input_paths([
+            banana_path,
+            FIXTURES_DIR,
+            os.path.join(FIXTURES_DIR, '*.png'),
+        ])
+        self.assertEqual(input_paths[0], banana_path)
+        self.assertEqual(len(input_paths), len(set(input_paths)))
+        self.assertIn(os.path.join(FIXTURES_DIR, 'gradient.png'),
+                      input_paths)
+        # sub-directories are not images
+        self.assertNotIn(os.path.join(FIXTURES_DIR, 'formats'), input_paths)
+
+    def test_run_batch(self):
+        input_paths = [os.path.join(FIXTURES_DIR, 'banana.png'),
+                       os.path.join(FIXTURES_DIR, 'gradient.png')]
+        with TemporaryDirectory() as output_dir:
+            invalid_path = os.path.join(output_dir, 'invalid.png')
+            with open(invalid_path, 'w') as invalid_file:
+                invalid_file.write('not an image')
+
+            errors = run_batch([*input_paths, invalid_path],
+                               output_dir,
+                               dict(pretty=False),
+                               workers=2)
+            self.assertEqual([error[0] for error in errors], [invalid_path])
+            for input_path in input_paths:
+                self.assertTrue(os.path.isfile(
+                    batch_output_path(input_path, output_dir)))
+
+            # up to date outputs are skipped
+            output_path = batch_output_path(input_paths[0], output_dir)
+            os.remove(batch_output_path(input_paths[1], output_dir))
+            modification_time = os.path.getmtime(output_path)
+            self.assertEqual(run_batch(input_paths, output_dir, {}), [])
+            self.assertEqual(os.path.getmtime(output_path),
+                             modification_time)
+            self.assertTrue(os.path.isfile(
+                batch_output_path(input_paths[1], output_dir)))
+
+    def test_run_batch_same_file_names(self):
+        with TemporaryDirectory() as input_dir, \
+                TemporaryDirectory() as output_dir:
+            input_paths = []
+            for sub_dir, fixture in (('a', 'banana.png'),
+                                     ('b', 'gradient.png')):
+                os.mkdir(os.path.join(input_dir, sub_dir))
+                input_paths.append(os.path.join(input_dir, sub_dir, 'x.png'))
+                shutil.copy(os.path.join(FIXTURES_DIR, fixture),
+                            input_paths[-1])
+
+            errors = run_batch(input_paths, output_dir, {}, workers=2)
+            # the second image is not converted over the SVG of the first
+            self.assertEqual([error[0] for error in errors],
+                             [input_paths[1]])
+            self.assertIsInstance(errors[0][1], ValueError)
+            self.assertEqual(os.listdir(output_dir), ['x.svg'])
+            with open(os.path.join(output_dir, 'x.svg')) as svg_file:
+                self.assertEqual(svg_file.read(),
+                                 pixels2svg(input_paths[0], as_string=True))
+
+    def test_stdin_stdout_pipe(self):
+        with open(SWORD_PNG_PATH, 'rb') as image_file:
+            completed_process = subprocess.run(
+                [sys.executable, '-m', 'pixels2svg', '-', '--no_pretty'],
+                stdin=image_file,
+                stdout=subprocess.PIPE,
+                check=True,
+                cwd=os.path.dirname(TEST_DIR))
+        self.assertEqual(
+            completed_process.stdout.decode('utf-8'),
+            pixels2svg(SWORD_PNG_PATH, as_string=True, pretty=False) + '\n')
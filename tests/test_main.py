@@ -1,5 +1,8 @@
 import os
+import time
 import unittest
+from io import BytesIO, StringIO
+from itertools import product
 from tempfile import NamedTemporaryFile
 
 import numpy as np
@@ -9,8 +12,9 @@ from PIL.Image import NEAREST, fromarray
 
 from tests.base import BRAIN_OVERLAY_PNG_PATH, EMPTY_PNG_PATH, SWORD_PNG_PATH
 
-from pixels2svg.main import pixels2svg
-from pixels2svg.utils.pixel import read_image
+from pixels2svg.main import (find_contours, pixels2svg,
+                             trace_pixel_polygons_as_svg)
+from pixels2svg.utils.pixel import load_image, read_image
 
 
 class TestMain(unittest.TestCase):
@@ -79,3 +83,91 @@ class TestMain(unittest.TestCase):
                     output_image_array_resampled = read_image(output_png.name)
                     assert_array_equal(orig_image_array_resampled,
                                        output_image_array_resampled)
+
+    def test_svg_writer_output(self):
+        for image_path in (SWORD_PNG_PATH,
+                           EMPTY_PNG_PATH,
+                           BRAIN_OVERLAY_PNG_PATH):
+            image_array = read_image(image_path)
+            for group_by_color, pretty in product((False, True), repeat=2):
+                drawing = trace_pixel_polygons_as_svg(image_array,
+                                                      group_by_color)
+                svg_str = drawing.to_string(pretty=pretty)
+                self.assertEqual(
+                    pixels2svg(image_path,
+                               group_by_color=group_by_color,
+                               as_string=True,
+                               pretty=pretty),
+                    svg_str)
+
+                # stream to text and binary file objects
+                text_io, bytes_io = StringIO(), BytesIO()
+                for output in (text_io, bytes_io):
+                    self.assertIsNone(pixels2svg(image_path,
+                                                 output_path=output,
+                                                 group_by_color=group_by_color,
+                                                 pretty=pretty))
+                    self.assertFalse(output.closed)
+                self.assertEqual(text_io.getvalue(), svg_str)
+                self.assertEqual(bytes_io.getvalue().decode('utf-8'), svg_str)
+
+    def test_in_memory_input(self):
+        image_array = read_image(SWORD_PNG_PATH)
+        svg_str = pixels2svg(SWORD_PNG_PATH,
+                             as_string=True,
+                             remove_background=True)
+        with open(SWORD_PNG_PATH, 'rb') as image_file:
+            image_bytes = image_file.read()
+        for image in (image_array, image_bytes, BytesIO(image_bytes)):
+            self.assertEqual(pixels2svg(image,
+                                        as_string=True,
+                                        remove_background=True),
+                             svg_str)
+        # the input array is not modified
+        assert_array_equal(image_array, read_image(SWORD_PNG_PATH))
+
+    def test_palette_input(self):
+        rng = np.random.default_rng(0)
+        indices = rng.integers(0, 4, size=(30, 20)).astype(np.uint8)
+        palette_image = fromarray(indices, 'P')
+        palette_image.putpalette([10, 20, 30, 10, 20, 30, 200, 0, 0, 0, 0, 0])
+        palette_image.info['transparency'] = 2
+        rgba_array = read_image(EMPTY_PNG_PATH)
+        for image, image_array in ((palette_image,
+                                    load_image(palette_image)),
+                                   (EMPTY_PNG_PATH, rgba_array)):
+            for group_by_color in (False, True):
+                self.assertEqual(
+                    pixels2svg(image,
+                               group_by_color=group_by_color,
+                               as_string=True),
+                    pixels2svg(image_array,
+                               group_by_color=group_by_color,
+                               as_string=True))
+
+    @unittest.skipUnless(os.environ.get('PIXELS2SVG_BENCHMARKS'),
+                         'timing benchmark, set PIXELS2SVG_BENCHMARKS=1 to '
+                         'run it')
+    def test_find_contours_many_blobs_benchmark(self):
+        # checkerboard: every pixel is a separate blob
+        def checkerboard(size: int) -> np.ndarray:
+            rgba_array = np.full((size, size, 4), 255, dtype=np.uint8)
+            rgba_array[np.indices((size, size)).sum(axis=0) % 2 == 1,
+                       :3] = 0
+            return rgba_array
+
+        def trace_duration(rgba_array: np.ndarray,
+                           group_by_color: bool) -> float:
+            durations = []
+            for _ in range(3):
+                start = time.perf_counter()
+                find_contours(rgba_array, group_by_color)
+                durations.append(time.perf_counter() - start)
+            return min(durations)
+
+        small, large = checkerboard(50), checkerboard(100)
+        for group_by_color in (False, True):
+            small_duration = trace_duration(small, group_by_color)
+            large_duration = trace_duration(large, group_by_color)
+            # 4x more blobs: should take ~4x longer, 16x if quadratic
+            self.assertLess(large_duration, 8 * small_duration)
@@ -0,0 +1,78 @@
+import base64
+import json
+import os
+import socket
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+
+from tests.base import FIXTURES_DIR, SWORD_PNG_PATH
+
+from pixels2svg.main import pixels2svg
+from pixels2svg.server import make_unix_socket_server, serve_lines
+
+
+class TestServer(unittest.TestCase):
+
+    def test_serve_lines(self):
+        banana_path = os.path.join(FIXTURES_DIR, 'banana.png')
+        with open(SWORD_PNG_PATH, 'rb') as image_file:
+            sword_data = base64.b64encode(image_file.read()).decode('ascii')
+
+        with TemporaryDirectory() as output_dir:
+            output_path = os.path.join(output_dir, 'sword.svg')
+            jobs = [
+                {'id': 'banana', 'input': banana_path,
+                 'options': {'pretty': False}},
+                {'id': 'sword', 'data': sword_data, 'output': output_path},
+                {'id': 'missing', 'input': 'missing.png'},
+                {'id': 'invalid option', 'input': banana_path,
+                 'options': {'invalid': True}},
+            ]
+            lines = [json.dumps(job) for job in jobs] + ['', 'not json']
+            responses = []
+            with ThreadPoolExecutor(2) as executor:
+                serve_lines(lines,
+                            lambda line: responses.append(json.loads(line)),
+                            executor)
+
+            self.assertEqual(len(responses), 5)
+            responses = {response['id']: response for response in responses}
+            self.assertEqual(responses['banana']['svg'],
+                             pixels2svg(banana_path,
+                                        as_string=True,
+                                        pretty=False))
+            self.assertEqual(responses['sword']['output'], output_path)
+            with open(output_path) as svg_file:
+                self.assertEqual(svg_file.read(),
+                                 pixels2svg(SWORD_PNG_PATH, as_string=True))
+            self.assertIn('FileNotFoundError', responses['missing']['error'])
+            self.assertIn('TypeError', responses['invalid option']['error'])
+            self.assertIn('JSONDecodeError', responses[None]['error'])
+
+    def test_unix_socket_server(self):
+        with TemporaryDirectory() as socket_dir, \
+                ThreadPoolExecutor(2) as executor:
+            socket_path = os.path.join(socket_dir, 'pixels2svg.sock')
+            server = make_unix_socket_server(socket_path, executor)
+            server_thread = threading.Thread(target=server.serve_forever)
+            server_thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX) as client:
+                    client.connect(socket_path)
+                    client.sendall(json.dumps(
+                        {'id': 1, 'input': SWORD_PNG_PATH}).encode('utf-8')
+                        + b'\n')
+                    client.shutdown(socket.SHUT_WR)
+                    with client.makefile('rb') as responses:
+                        response = json.loads(responses.readline())
+                        self.assertEqual(responses.read(), b'')
+            finally:
+                server.shutdown()
+                server.server_close()
+                server_thread.join()
+
+        self.assertEqual(response,
+                         {'id': 1,
+                          'svg': pixels2svg(SWORD_PNG_PATH, as_string=True)})
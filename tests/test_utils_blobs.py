@@ -0,0 +1,32 @@
+import unittest
+
+import cc3d
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from tests.base import SWORD_PNG_PATH
+
+from pixels2svg.utils.blobs import LabelledImage
+from pixels2svg.utils.pixel import (TRUE_TRANSPARENT, read_image,
+                                    rgba_array_to_id_array)
+
+
+class TestUtilsBlobs(unittest.TestCase):
+
+    def test_labelled_image(self):
+        img = read_image(SWORD_PNG_PATH)
+        image = LabelledImage(img.copy(order='K'))
+        assert_array_equal(image.id_array, rgba_array_to_id_array(img))
+        labels = cc3d.connected_components(rgba_array_to_id_array(img),
+                                           out_dtype=np.uint64,
+                                           connectivity=4)
+        assert_array_equal(image.labels, labels)
+
+        # clear the blob of the first pixel
+        mask = labels == labels[0, 0]
+        image.clear(mask)
+        assert_array_equal(image.rgba_array[mask],
+                           np.tile(TRUE_TRANSPARENT, (mask.sum(), 1)))
+        assert_array_equal(image.id_array,
+                           rgba_array_to_id_array(image.rgba_array))
+        assert_array_equal(image.labels, np.where(mask, 0, labels))
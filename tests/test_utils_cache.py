@@ -0,0 +1,68 @@
+import os
+import unittest
+from io import BytesIO
+from tempfile import TemporaryDirectory
+
+from tests.base import SWORD_PNG_PATH
+
+from pixels2svg.main import pixels2svg
+from pixels2svg.utils.cache import SVGCache
+from pixels2svg.utils.pixel import read_image
+
+
+class TestUtilsCache(unittest.TestCase):
+
+    def test_cache_key(self):
+        img = read_image(SWORD_PNG_PATH)
+        key = SVGCache.key(img, pretty=True, color_tolerance=0)
+        self.assertEqual(key, SVGCache.key(img.copy(),
+                                           color_tolerance=0,
+                                           pretty=True))
+        self.assertNotEqual(key, SVGCache.key(img,
+                                              pretty=False,
+                                              color_tolerance=0))
+        modified_img = img.copy()
+        modified_img[0, 0, 0] ^= 1
+        self.assertNotEqual(key, SVGCache.key(modified_img,
+                                              pretty=True,
+                                              color_tolerance=0))
+
+    def test_cache_eviction(self):
+        with TemporaryDirectory() as cache_dir:
+            cache = SVGCache(cache_dir, max_size=250)
+            for key in ('a', 'b', 'c'):
+                cache.put(key, key * 100)
+                # make sure the access times are different
+                os.utime(os.path.join(cache_dir, f'{key}.svg'),
+                         (len(os.listdir(cache_dir)),) * 2)
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 'b' * 100)
+            self.assertEqual(cache.get('c'), 'c' * 100)
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+            # 'b' was used more recently than 'c'
+            os.utime(os.path.join(cache_dir, 'c.svg'), (0, 0))
+            cache.put('d', 'd' * 100)
+            self.assertIsNone(cache.get('c'))
+            self.assertIsNotNone(cache.get('b'))
+
+    def test_pixels2svg_cache(self):
+        with TemporaryDirectory() as cache_dir:
+            cache = SVGCache(cache_dir)
+            svg_str = pixels2svg(SWORD_PNG_PATH, as_string=True, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(
+                pixels2svg(SWORD_PNG_PATH, as_string=True, cache=cache),
+                svg_str)
+            output = BytesIO()
+            pixels2svg(SWORD_PNG_PATH, output_path=output, cache=cache)
+            self.assertEqual(output.getvalue().decode('utf-8'), svg_str)
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+            self.assertNotEqual(
+                pixels2svg(SWORD_PNG_PATH,
+                           as_string=True,
+                           pretty=False,
+                           cache=cache),
+                svg_str)
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
@@ -5,15 +5,15 @@ import cc3d
 import numpy as np
 from PIL import Image, ImageDraw
 
-from tests.base import FIXTURES_DIR
+from tests.base import FIXTURES_DIR, SWORD_PNG_PATH
 
 from pixels2svg.utils import geometry
-from pixels2svg.utils.pixel import read_image
+from pixels2svg.utils.pixel import read_image, rgba_array_to_id_array
 
 
 class TestUtilsGeometry(unittest.TestCase):
 
-    def test__get_pixel_contour_segments(self):
+    def test__get_contour_segments(self):
 
         array_1 = np.array([
             [1, 1, 0],
@@ -21,17 +21,28 @@ class TestUtilsGeometry(unittest.TestCase):
             [0, 0, 0],
         ])
 
-        lines_1 = geometry._get_pixel_contour_segments(array_1, 0, 0)
-        self.assertIn(((0, 1), (0, 0)), lines_1)
-        self.assertIn(((0, 0), (1, 0)), lines_1)
-        self.assertEqual(len(lines_1), 2)
-
-        lines_2 = geometry._get_pixel_contour_segments(array_1, 0, 1)
-        self.assertIn(((1, 2), (0, 2)), lines_2)
-        self.assertIn(((0, 2), (0, 1)), lines_2)
-        self.assertEqual(len(lines_1), 2)
+        segments, segment_labels = geometry._get_contour_segments(array_1)
+        lines = set(tuple(map(tuple, line)) for line in segments.tolist())
+        self.assertIn(((0, 1), (0, 0)), lines)
+        self.assertIn(((0, 0), (1, 0)), lines)
+        self.assertIn(((1, 2), (0, 2)), lines)
+        self.assertIn(((0, 2), (0, 1)), lines)
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(segments.shape, (8, 2, 2))
+        self.assertTrue(np.all(segment_labels == 1))
+
+        array_2 = np.array([
+            [1, 2],
+            [0, 2],
+        ])
 
-        # TODO add more tests
+        segments, segment_labels = geometry._get_contour_segments(array_2)
+        lines = set(tuple(map(tuple, line)) for line in segments.tolist())
+        # shared side between labels 1 and 2, in both directions
+        self.assertIn(((1, 1), (0, 1)), lines)
+        self.assertIn(((0, 1), (1, 1)), lines)
+        self.assertEqual(np.count_nonzero(segment_labels == 1), 4)
+        self.assertEqual(np.count_nonzero(segment_labels == 2), 6)
 
     def test_minimal_polygon(self):
 
@@ -59,6 +70,18 @@ class TestUtilsGeometry(unittest.TestCase):
             ((0, 0), (0, 3), (3, 3), (3, 0))
         )
 
+        # all the aligned points are removed, wherever they are
+        rectangle = ((0, 1), (1, 1), (1, 2), (1, 3), (0, 3), (0, 2))
+        self.assertEqual(
+            geometry.minimal_polygon(rectangle),
+            ((0, 1), (1, 1), (1, 3), (0, 3))
+        )
+
+        np.testing.assert_array_equal(
+            geometry.minimal_polygon_array(np.array(square)),
+            [[0, 0], [0, 3], [3, 3], [3, 0]]
+        )
+
     def test_polygon_contours_integration(self):
         """Used for development"""
         img = read_image(os.path.join(FIXTURES_DIR, 'polygon_blobs.png'))
@@ -80,3 +103,65 @@ class TestUtilsGeometry(unittest.TestCase):
         end_blobs = np.array(end_blobs_img).T
         # Image.fromarray(end_blobs).show()
         self.assertTrue(np.all(end_blobs[blobs]))
+
+    def test_calculate_blob_contours_diagonal_hole(self):
+        # the hole at (2, 1) touches the outside at point (2, 2)
+        blob = np.array([
+            [0, 0, 0],
+            [1, 1, 0],
+            [1, 0, 1],
+            [1, 1, 1],
+        ])
+
+        contours = geometry.calculate_blob_contours(blob)
+        self.assertEqual(len(contours.inner_holes), 1)
+        self.assertEqual(set(contours.inner_holes[0]),
+                         {(2, 1), (3, 1), (3, 2), (2, 2)})
+
+    def test_calculate_labels_contours(self):
+        for image_path in (os.path.join(FIXTURES_DIR, 'polygon_blobs.png'),
+                           SWORD_PNG_PATH):
+            img = read_image(image_path)
+            labels = cc3d.connected_components(rgba_array_to_id_array(img),
+                                               out_dtype=np.uint64,
+                                               connectivity=4)
+            labels_contours = geometry.calculate_labels_contours(labels)
+
+            blob_ids = set()
+            for blob_id, blob_shape in cc3d.each(labels,
+                                                 binary=True,
+                                                 in_place=True):
+                blob_ids.add(blob_id)
+                contours = geometry.calculate_blob_contours(blob_shape)
+                self.assertEqual(labels_contours[blob_id].outside,
+                                 contours.outside)
+                self.assertEqual(labels_contours[blob_id].inner_holes,
+                                 contours.inner_holes)
+            self.assertEqual(set(labels_contours), blob_ids)
+
+    def test_calculate_blob_contours_large_blob(self):
+        blob = np.ones((1000, 800), dtype=bool)
+        blob[100:900, 100:700] = False
+
+        contours = geometry.calculate_blob_contours(blob)
+        self.assertEqual(geometry.bounding_box(contours.outside),
+                         (0, 1000, 0, 800))
+        self.assertEqual(len(contours.inner_holes), 1)
+        self.assertEqual(geometry.bounding_box(contours.inner_holes[0]),
+                         (100, 900, 100, 700))
+
+    def test_contours_arrays(self):
+        contours = geometry.Contours(((0, 0), (0, 3), (3, 3), (3, 0)),
+                                     (((1, 1), (1, 2), (2, 2), (2, 1)),))
+        self.assertEqual(contours.vertices.dtype, np.int32)
+        self.assertEqual(contours.vertices.shape, (8, 2))
+        self.assertEqual(contours.ring_offsets.tolist(), [0, 4, 8])
+        self.assertEqual(contours.outside,
+                         ((0, 0), (0, 3), (3, 3), (3, 0)))
+        self.assertEqual(contours.inner_holes,
+                         (((1, 1), (1, 2), (2, 2), (2, 1)),))
+        self.assertEqual(len(contours.rings()), 2)
+        self.assertFalse(hasattr(contours, '__dict__'))
+
+        self.assertEqual(geometry.Contours(contours.outside).inner_holes,
+                         tuple())
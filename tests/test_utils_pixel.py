@@ -1,7 +1,9 @@
 import os
 import unittest
 
+import numpy as np
 from numpy.testing import assert_array_equal
+from PIL import Image
 
 from tests.base import FIXTURES_DIR, SWORD_PNG_PATH
 
@@ -36,3 +38,86 @@ class TestUtilsPixel(unittest.TestCase):
         array_base = image_arrays[0]
         for array_comp in image_arrays[1:]:
             assert_array_equal(array_base, array_comp)
+
+    def test_load_image(self):
+        img = pixel.read_image(SWORD_PNG_PATH)
+        with open(SWORD_PNG_PATH, 'rb') as image_file:
+            image_bytes = image_file.read()
+            image_file.seek(0)
+            assert_array_equal(img, pixel.load_image(image_file))
+        assert_array_equal(img, pixel.load_image(SWORD_PNG_PATH))
+        assert_array_equal(img, pixel.load_image(image_bytes))
+        assert_array_equal(img, pixel.load_image(memoryview(image_bytes)))
+        with Image.open(SWORD_PNG_PATH) as image:
+            assert_array_equal(img, pixel.load_image(image))
+
+        # arrays are not copied
+        self.assertIs(pixel.load_image(img), img)
+        rgb_img = img[:, :, :3]
+        rgba_img = pixel.load_image(rgb_img)
+        assert_array_equal(rgba_img[:, :, :3], rgb_img)
+        self.assertTrue(np.all(rgba_img[:, :, 3] == 255))
+
+        with self.assertRaises(ValueError):
+            pixel.load_image(img[:, :, 0])
+
+    def test_image_to_rgba_array(self):
+        image = Image.new('RGBA', (3, 2), (10, 20, 30, 255))
+        image.putpixel((1, 0), (40, 50, 60, 0))
+        rgba_array = pixel.image_to_rgba_array(image)
+        self.assertEqual(rgba_array.shape, (3, 2, 4))
+        self.assertEqual(tuple(rgba_array[1, 0]), pixel.TRUE_TRANSPARENT)
+        self.assertEqual(tuple(rgba_array[0, 1]), (10, 20, 30, 255))
+        # the input image is not modified
+        self.assertEqual(image.getpixel((1, 0)), (40, 50, 60, 0))
+
+        # the axes are swapped in a view of PIL's Y/X layout
+        img = pixel.read_image(SWORD_PNG_PATH)
+        self.assertTrue(np.swapaxes(img, 0, 1).flags.c_contiguous)
+
+    def test_palette_image_to_color_indices(self):
+        indices = np.array([[0, 1, 1], [2, 3, 0]], dtype=np.uint8)
+        image = Image.fromarray(indices, 'P')
+        # indices 0 and 1 have the same color, index 3 is transparent
+        image.putpalette([10, 20, 30, 10, 20, 30, 0, 0, 0, 40, 50, 60])
+        image.info['transparency'] = 3
+        color_indices, colors = pixel.palette_image_to_color_indices(image)
+        self.assertEqual(color_indices.shape, (3, 2))
+        assert_array_equal(colors[color_indices],
+                           pixel.image_to_rgba_array(image))
+        self.assertEqual(len(np.unique(color_indices)), 3)
+        # 0 is only the index of the (0, 0, 0, 0) color
+        self.assertNotIn(0, color_indices)
+
+        image = Image.fromarray(np.arange(256, dtype=np.uint8)[np.newaxis],
+                                'P')
+        image.putpalette([1, 2, 3] * 256)
+        color_indices, colors = pixel.palette_image_to_color_indices(image)
+        self.assertEqual(color_indices.dtype, np.uint8)
+        self.assertTrue(np.all(color_indices == 1))
+
+        # 256 colors plus the background index
+        image.putpalette(list(range(256)) * 3)
+        color_indices, colors = pixel.palette_image_to_color_indices(image)
+        self.assertEqual(color_indices.dtype, np.uint16)
+        assert_array_equal(colors[color_indices],
+                           pixel.image_to_rgba_array(image))
+
+    def test_id_to_from_rgba_array_any_shape(self):
+        colors = np.array([(184, 0, 255, 54), (0, 0, 0, 0), (1, 2, 3, 4)],
+                          dtype=np.uint8)
+        ids = pixel.rgba_array_to_id_array(colors)
+        self.assertEqual(ids.dtype, np.uint32)
+        self.assertEqual(ids.tolist(),
+                         [pixel.rgba_to_id(tuple(c)) for c in colors])
+        assert_array_equal(pixel.id_array_to_rgba_array(ids), colors)
+        self.assertEqual(
+            [pixel.id_to_rgba(label) for label in ids],
+            [tuple(c) for c in pixel.id_array_to_rgba_array(ids).tolist()])
+
+        # views with any memory layout
+        img = pixel.read_image(SWORD_PNG_PATH)
+        for img_view in (img[::2, 1::3], np.ascontiguousarray(img),
+                         np.moveaxis(np.moveaxis(img, 2, 0).copy(), 0, 2)):
+            ids = pixel.rgba_array_to_id_array(img_view)
+            assert_array_equal(pixel.id_array_to_rgba_array(ids), img_view)
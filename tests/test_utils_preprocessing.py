@@ -7,6 +7,7 @@ from numpy.testing import assert_array_equal
 from tests.base import EMPTY_PNG_PATH, FIXTURES_DIR
 
 from pixels2svg.utils import preprocessing
+from pixels2svg.utils.blobs import LabelledImage
 from pixels2svg.utils.pixel import read_image, rgba_array_to_id_array
 
 
@@ -19,6 +20,25 @@ class TestUtilsPixel(unittest.TestCase):
             res = preprocessing.apply_color_tolerance(empty_img, tolerance)
             assert_array_equal(empty_img, res)
 
+    def test_reduce_colors(self):
+        img_array = np.zeros((2, 3, 4), dtype=np.uint8)
+        img_array[0, :, :] = [(0, 10, 20, 0), (30, 40, 50, 128),
+                              (60, 70, 80, 255)]
+        img_array[1, :, :] = [(90, 100, 110, 1), (120, 130, 140, 254),
+                              (250, 251, 252, 253)]
+
+        # no tolerance: only the non-zero alphas are shifted, except 255
+        reduced_colors = preprocessing._reduce_colors(img_array, 0)
+        assert_array_equal(reduced_colors[:, :, :3], img_array[:, :, :3])
+        assert_array_equal(reduced_colors[:, :, 3],
+                           [(0, 129, 255), (2, 255, 254)])
+
+        reduced_colors = preprocessing._reduce_colors(img_array, 10)
+        self.assertEqual(reduced_colors.dtype, np.uint8)
+        b_reduction_factor = 1 + 2 * 10 * preprocessing.B_TOLERANCE_UNIT
+        assert_array_equal(reduced_colors[:, :, 2],
+                           img_array[:, :, 2] // b_reduction_factor)
+
     def test_apply_color_tolerance(self):
         img_array = np.zeros((3, 3, 4), dtype=np.uint8)
         img_array[0, 0, :] = (120, 120, 120, 255)
@@ -32,6 +52,20 @@ class TestUtilsPixel(unittest.TestCase):
         assert_array_equal(reduced_colors[1, 0, :3], (120, 120, 120))
         assert_array_equal(reduced_colors[0, 1, :3], (120, 120, 120))
 
+    def test_apply_color_tolerance_main_color(self):
+        # one blob of 3 colors, the largest one has an outlier alpha
+        img_array = np.zeros((11, 1, 4), dtype=np.uint8)
+        img_array[:5, 0, :] = (100, 100, 100, 100)
+        img_array[5:8, 0, :] = (100, 100, 100, 102)
+        img_array[8:10, 0, :] = (100, 100, 100, 101)
+        img_array[10, 0, :] = (0, 0, 0, 1)
+
+        reduced_colors = preprocessing.apply_color_tolerance(img_array, 50)
+        assert_array_equal(reduced_colors[:10, 0],
+                           np.tile((100, 100, 100, 102), (10, 1)))
+        # reduced to (0, 0, 0, 0)
+        assert_array_equal(reduced_colors[10, 0], (0, 0, 0, 0))
+
     def test_apply_color_tolerance_integration(self):
         img_array = read_image(os.path.join(FIXTURES_DIR, 'gradient.png'))
         reduced_colors = preprocessing.apply_color_tolerance(img_array, 4)
@@ -44,6 +78,30 @@ class TestUtilsPixel(unittest.TestCase):
         # from PIL import Image
         # Image.fromarray(np.swapaxes(reduced_colors, 0, 1)).show()
 
+    def test_labelled_preprocessing(self):
+        img_array = read_image(os.path.join(FIXTURES_DIR, 'gradient.png'))
+        for tolerance in (1, 4, 20):
+            image = preprocessing.apply_color_tolerance_labelled(
+                LabelledImage(img_array), tolerance)
+            assert_array_equal(
+                image.rgba_array,
+                preprocessing.apply_color_tolerance(img_array, tolerance))
+            assert_array_equal(image.id_array,
+                               rgba_array_to_id_array(image.rgba_array))
+            # the reused labels are the same as labelling the result again
+            assert_array_equal(image.labels,
+                               LabelledImage(image.rgba_array).labels)
+
+        img_array = read_image(os.path.join(FIXTURES_DIR, 'banana.png'))
+        image = LabelledImage(img_array.copy(order='K'))
+        labels = image.labels.copy()
+        image = preprocessing.remove_background_labelled(image)
+        assert_array_equal(
+            image.rgba_array,
+            preprocessing.remove_background(img_array.copy(order='K')))
+        assert_array_equal(image.labels,
+                           np.where(image.rgba_array[:, :, 3] == 0, 0, labels))
+
     def test_remove_background_empty_image(self):
 
         empty_img = read_image(EMPTY_PNG_PATH)
@@ -65,3 +123,25 @@ class TestUtilsPixel(unittest.TestCase):
 
         # from PIL import Image
         # Image.fromarray(np.swapaxes(res, 0, 1)).show()
+
+    def test_downscale(self):
+        gray = np.arange(5 * 3, dtype=np.uint8).reshape((5, 3))
+        assert_array_equal(preprocessing._downscale(gray, 2),
+                           [[2, 4], [8, 10], [12, 14]])
+
+    def test_remove_background_downscaled_masks(self):
+        img_array = read_image(os.path.join(FIXTURES_DIR, 'banana.png'))
+        img_array = np.repeat(np.repeat(img_array, 4, axis=0), 4, axis=1)
+        res = preprocessing.remove_background(img_array.copy(order='K'))
+
+        # not downscaled
+        assert_array_equal(
+            preprocessing.remove_background(img_array.copy(order='K'),
+                                            mask_size=max(img_array.shape)),
+            res)
+
+        downscaled_res = preprocessing.remove_background(
+            img_array.copy(order='K'), mask_size=128)
+        self.assertGreater(np.mean((res[:, :, 3] == 0)
+                                   == (downscaled_res[:, :, 3] == 0)),
+                           0.98)
@@ -1,6 +1,13 @@
+import os
 import unittest
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from svgwrite.container import Group
 
 from pixels2svg.utils import svg
+from pixels2svg.utils.geometry import Contours
 
 
 class TestUtilsSVG(unittest.TestCase):
@@ -20,4 +27,49 @@ class TestUtilsSVG(unittest.TestCase):
                          color=(0, 0, 255),
                          opacity=0.5)
 
-        svg_img.save_to_path('test_draw_polygon.svg')
+        with TemporaryDirectory() as output_dir:
+            output_path = os.path.join(output_dir, 'test_draw_polygon.svg')
+            svg_img.save_to_path(output_path)
+            self.assertTrue(os.path.isfile(output_path))
+
+    def test_svg_writer(self):
+        contours = Contours(((25, 25), (75, 25), (75, 75), (25, 75)),
+                            (((40, 40), (50, 40), (50, 50), (40, 50)),))
+        path_data = svg.contours_to_path_data(contours)
+        self.assertEqual(
+            path_data,
+            svg.polygon_with_holes_to_path_data(contours.outside,
+                                                contours.inner_holes))
+
+        svg_img = svg.Drawing(100, 80)
+        group = Group(id='group')
+        svg.draw_path(group, path_data, (0, 0, 255, 128), id='shape1')
+        svg_img.add(group)
+        svg.draw_path(svg_img, path_data, '#ff0000', id='shape2')
+
+        for pretty in (False, True):
+            svg_io = StringIO()
+            svg_writer = svg.SVGWriter(svg_io, 100, 80, pretty=pretty)
+            svg_writer.open_group('group')
+            svg_writer.write_path(path_data, (0, 0, 255, 128), id='shape1')
+            svg_writer.close_group()
+            svg_writer.write_path(path_data, '#ff0000', id='shape2')
+            svg_writer.close()
+
+            self.assertEqual(svg_io.getvalue(),
+                             svg_img.to_string(pretty=pretty))
+
+    def test_open_text_output(self):
+        with TemporaryDirectory() as output_dir:
+            for output_path in (os.path.join(output_dir, 'str.svg'),
+                                Path(output_dir, 'path.svg')):
+                with svg.open_text_output(output_path) as svg_file:
+                    svg_file.write('<svg />')
+                with open(output_path, encoding='utf-8') as svg_file:
+                    self.assertEqual(svg_file.read(), '<svg />')
+
+        binary_io = BytesIO()
+        with svg.open_text_output(binary_io) as svg_file:
+            svg_file.write('<svg />')
+        self.assertFalse(binary_io.closed)
+        self.assertEqual(binary_io.getvalue(), b'<svg />')
@@ -0,0 +1,50 @@
+import os
+import unittest
+
+import cc3d
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from tests.base import FIXTURES_DIR, SWORD_PNG_PATH
+
+from pixels2svg.utils import geometry, tiling
+from pixels2svg.utils.pixel import read_image, rgba_array_to_id_array
+
+
+class TestUtilsTiling(unittest.TestCase):
+
+    def assert_same_contours(self, labels: np.ndarray, n_tiles: int):
+        labels_contours = geometry.calculate_labels_contours(labels)
+        tiled_labels_contours = tiling.calculate_labels_contours_tiled(
+            labels, n_tiles, workers=2)
+        self.assertEqual(list(tiled_labels_contours), list(labels_contours))
+        for label, contours in labels_contours.items():
+            assert_array_equal(tiled_labels_contours[label].vertices,
+                               contours.vertices)
+            assert_array_equal(tiled_labels_contours[label].ring_offsets,
+                               contours.ring_offsets)
+
+    def test_calculate_labels_contours_tiled(self):
+        for image_path in (os.path.join(FIXTURES_DIR, 'polygon_blobs.png'),
+                           os.path.join(FIXTURES_DIR, 'banana.png'),
+                           SWORD_PNG_PATH):
+            img = read_image(image_path)
+            labels = cc3d.connected_components(rgba_array_to_id_array(img),
+                                               out_dtype=np.uint64,
+                                               connectivity=4)
+            for n_tiles in (1, 2, 5):
+                self.assert_same_contours(labels, n_tiles)
+
+    def test_calculate_labels_contours_tiled_random(self):
+        # random blobs with holes and diagonal contacts across the seams
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            image = rng.integers(0, 3, size=(30, 20)).astype(np.uint32)
+            labels = cc3d.connected_components(image + 1,
+                                               out_dtype=np.uint64,
+                                               connectivity=4)
+            labels[image == 0] = 0
+            self.assert_same_contours(labels, 4)
+
+        # more tiles than rows
+        self.assert_same_contours(labels[:3], 8)
@@ -0,0 +1,71 @@
+import os
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from tests.base import FIXTURES_DIR, SWORD_PNG_PATH
+
+from pixels2svg.utils import tracing
+from pixels2svg.utils.pixel import read_image
+
+
+class TestUtilsTracing(unittest.TestCase):
+
+    def assert_same_trace(self,
+                          trace: tracing.LabelsTrace,
+                          expected_trace: tracing.LabelsTrace):
+        assert_array_equal(trace.labels, expected_trace.labels)
+        self.assertEqual(trace.labels_colors, expected_trace.labels_colors)
+        assert_array_equal(trace.labels_areas, expected_trace.labels_areas)
+        self.assertEqual(list(trace.labels_contours),
+                         list(expected_trace.labels_contours))
+        for label, contours in expected_trace.labels_contours.items():
+            assert_array_equal(trace.labels_contours[label].vertices,
+                               contours.vertices)
+            assert_array_equal(trace.labels_contours[label].ring_offsets,
+                               contours.ring_offsets)
+
+    def test_retrace_labels(self):
+        rng = np.random.default_rng(0)
+        for image_path in (os.path.join(FIXTURES_DIR, 'polygon_blobs.png'),
+                           SWORD_PNG_PATH):
+            img = read_image(image_path)
+            trace = tracing.trace_labels(img)
+            self.assert_same_trace(trace, tracing.trace_labels(img))
+
+            # nothing changed
+            retrace = tracing.retrace_labels(trace, img)
+            self.assert_same_trace(retrace, trace)
+            for label, contours in trace.labels_contours.items():
+                self.assertIs(retrace.labels_contours[label], contours)
+
+            # successive edits of a few pixels, including transparent ones,
+            # splitting and merging blobs
+            colors = np.unique(img.reshape(-1, 4), axis=0)
+            for _ in range(5):
+                img = img.copy()
+                for _ in range(3):
+                    x, y = rng.integers(0, img.shape[:2])
+                    img[x:x + rng.integers(1, 4), y:y + rng.integers(1, 4)] \
+                        = colors[rng.integers(0, len(colors))]
+                trace = tracing.retrace_labels(trace, img)
+                self.assert_same_trace(trace, tracing.trace_labels(img))
+
+            # different size
+            img = img[1:]
+            trace = tracing.retrace_labels(trace, img)
+            self.assert_same_trace(trace, tracing.trace_labels(img))
+
+    def test_retrace_labels_reuses_unchanged_blobs(self):
+        img = np.zeros((6, 6, 4), dtype=np.uint8)
+        img[:2, :2] = (255, 0, 0, 255)
+        img[4:, 4:] = (0, 255, 0, 255)
+        trace = tracing.trace_labels(img)
+
+        img[5, 5] = (0, 0, 255, 255)
+        retrace = tracing.retrace_labels(trace, img)
+        self.assert_same_trace(retrace, tracing.trace_labels(img))
+        red_label = retrace.labels[0, 0]
+        self.assertIs(retrace.labels_contours[red_label],
+                      trace.labels_contours[trace.labels[0, 0]])